@@ -0,0 +1,184 @@
+# batch_report.py
+"""Build card transaction reports without the GUI.
+
+    python batch_report.py xml_files --view ebt --format xlsx pdf -o reports/eod
+
+Ingests every XML file in a folder, builds one of the report views and writes
+it as Excel, PDF, CSV and/or Parquet. The ingested transactions can also be
+kept in a columnar archive partitioned by batch month (--archive) and later
+reported from it without touching the XML (--from-archive). pandas, openpyxl and reportlab are only
+imported once they are actually needed, and tkinter is never imported.
+"""
+import argparse
+import os
+import sys
+
+VIEWS = {
+    "ebt": "With EBT food",
+    "group": "Group by Date",
+    "totals": "Daily Totals",
+    "weekly": "Weekly Totals",
+    "monthly": "Monthly Totals",
+    "mix": "Card Type Mix",
+}
+FORMATS = ("xlsx", "pdf", "csv", "parquet")
+
+
+def iso_date(value):
+    import datetime
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="xml_files", help="folder of NAXML files (default: xml_files)")
+    parser.add_argument("--file", default="All Files", help="report on one file name instead of all files")
+    parser.add_argument("--from", dest="start_date", type=iso_date, help="first BatchDate to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", type=iso_date, help="last BatchDate to include (YYYY-MM-DD)")
+    parser.add_argument("--card-type", action="append", dest="card_types", help="only this card type; repeatable")
+    parser.add_argument("--view", choices=VIEWS, default="ebt", help="report view (default: ebt)")
+    parser.add_argument("--totals-only", action="store_true", help="group view: only the grand total row")
+    parser.add_argument("--sort", choices=("newest", "oldest"), default="newest", help="date order (default: newest)")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=["xlsx"], help="one or more output formats")
+    parser.add_argument("-o", "--output", default="report", help="output path without extension (default: report)")
+    parser.add_argument("--sheets", choices=("file", "month"),
+                        help="xlsx: one worksheet per source file or per batch month")
+    parser.add_argument("--summary-first", action="store_true", help="PDF: grand and daily totals before the detail")
+    parser.add_argument("--archive", metavar="DIR", help="also write the ingested transactions to this archive")
+    parser.add_argument("--archive-format", choices=("feather", "parquet"), default="feather",
+                        help="archive file format (default: feather, memory-mapped on reload)")
+    parser.add_argument("--from-archive", metavar="DIR", help="read transactions from this archive instead of the XML folder")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parser processes (1 = serial)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the on-disk parse cache and re-parse everything")
+    parser.add_argument("--cache-db", help="parse cache database file (default: parse_cache.db)")
+    parser.add_argument("--metrics", metavar="FILE", help="append per-stage timings as JSON lines to FILE")
+    parser.add_argument("--profile", choices=("cprofile", "tracemalloc"), help="with --metrics: also profile each stage")
+    return parser
+
+
+def ingest(folder, workers, use_disk_cache, cache_db=None, start_date=None, end_date=None, card_types=None):
+    import parse_cache
+    import program_manager
+
+    if cache_db:
+        parse_cache.CACHE_DB = cache_db
+    program_manager.set_ingest_filter(start_date, end_date, card_types)
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(".xml")
+    )
+    program_manager.load_files(paths, use_disk_cache=use_disk_cache, workers=workers)
+    return paths
+
+
+def load_archive(root, start_date=None, end_date=None, card_types=None):
+    import program_manager
+
+    program_manager.set_ingest_filter(start_date, end_date, card_types)
+    program_manager.load_archive(root)
+    return list(program_manager.transaction_cache)
+
+
+def build_report(file_name, view, ascending, totals_only):
+    import report_cache
+
+    return report_cache.get_report(file_name, VIEWS[view], ascending=ascending, totals_only=totals_only)
+
+
+def build_sheets(args):
+    """ {sheet title: report} for --sheets, in the report's date order. """
+    import program_manager
+    import report_cache
+
+    ascending = args.sort == "oldest"
+    if args.sheets == "file":
+        names = sorted(program_manager.transaction_cache)
+        frames = {name: build_report(name, args.view, ascending, args.totals_only) for name in names}
+    else:
+        months = program_manager.get_aggregate(args.file).split("month")
+        frames = {
+            month: report_cache.build(months[month], VIEWS[args.view], ascending, args.totals_only)
+            for month in sorted(months, reverse=not ascending)
+        }
+    return {title: df for title, df in frames.items() if not df.empty}
+
+
+def write_report(df, fmt, path, args):
+    if fmt == "xlsx" and args.sheets:
+        from excel_exporter import export_sheets_to_excel
+        export_sheets_to_excel(build_sheets(args), path)
+    elif fmt == "xlsx":
+        from excel_exporter import export_to_excel
+        export_to_excel(df, path)
+    elif fmt == "pdf":
+        from pdf_exporter import export_to_pdf
+        daily_totals = None
+        if args.summary_first:
+            daily_totals = build_report(args.file, "totals", args.sort == "oldest", False)
+        export_to_pdf(df, path, summary_first=args.summary_first, daily_totals=daily_totals)
+    elif fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    source = args.from_archive or args.folder
+    if not os.path.isdir(source):
+        print(f"Folder not found: {source}", file=sys.stderr)
+        return 2
+    if args.archive and (args.start_date or args.end_date or args.card_types):
+        print("--archive stores whole files; it cannot be combined with --from, --to or --card-type", file=sys.stderr)
+        return 2
+    if args.sheets == "file" and args.file != "All Files":
+        print("--sheets file writes every file; it cannot be combined with --file", file=sys.stderr)
+        return 2
+    if args.profile and not args.metrics:
+        print("--profile writes its results with the stage timings; it needs --metrics FILE", file=sys.stderr)
+        return 2
+
+    if args.metrics:
+        import instrumentation
+        instrumentation.enable(args.metrics, profile=args.profile)
+
+    if args.from_archive:
+        files = load_archive(args.from_archive, args.start_date, args.end_date, args.card_types)
+        if not files:
+            print(f"No archived transactions in {args.from_archive}", file=sys.stderr)
+            return 1
+    else:
+        paths = ingest(args.folder, args.workers, not args.no_cache, args.cache_db,
+                       args.start_date, args.end_date, args.card_types)
+        if not paths:
+            print(f"No XML files in {args.folder}", file=sys.stderr)
+            return 1
+
+    if args.archive:
+        import program_manager
+        written = program_manager.archive_files(args.archive, args.archive_format)
+        print(f"Archived {len(program_manager.transaction_cache)} file(s) to {args.archive} ({len(written)} partitions)")
+
+    df = build_report(args.file, args.view, args.sort == "oldest", args.totals_only)
+    if df.empty:
+        print(f"No transactions for {args.file}", file=sys.stderr)
+        return 1
+
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    for fmt in dict.fromkeys(args.format):
+        path = f"{args.output}.{fmt}"
+        write_report(df, fmt, path, args)
+        print(f"Wrote {path} ({len(df)} rows)")
+
+    if args.metrics:
+        instrumentation.write_summary(os.path.splitext(args.metrics)[0] + "_summary.json")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
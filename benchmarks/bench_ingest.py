@@ -0,0 +1,72 @@
+# benchmarks/bench_ingest.py
+"""Compare serial and process-pool ingestion of a folder of NAXML files.
+
+    python benchmarks/bench_ingest.py --files 32 --max-workers 4
+
+The sample file in xml_files/ is copied --files times into a temporary folder,
+then program_manager.load_files is timed serially and with 1..N workers.
+The on-disk parse cache is bypassed so every run measures real parsing.
+Fewer than xml_parser.MIN_POOL_FILES files are always parsed serially.
+
+Measured on a 1-CPU machine (Python 3.11, 10k-row sample): a file parses in
+~0.12 s, the first pool of a process costs ~0.65 s (fork server start and
+preload), later pools ~0.03 s, and sending a parsed file back ~0.01 s. With
+one core the pool cannot win (2 workers ran at 0.65-1.19x of serial for 2-32
+files, noise plus the pool cost). From these costs the first pool breaks even
+at about 12 files on 2 cores and 8 on 4, which is where MIN_POOL_FILES comes from.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import program_manager
+import xml_parser
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xml_files", "transactions_10000.xml")
+
+
+def make_folder(file_count, sample=SAMPLE):
+    folder = tempfile.mkdtemp(prefix="bench_ingest_")
+    for i in range(file_count):
+        shutil.copy(sample, os.path.join(folder, f"settlement_{i:04d}.xml"))
+    return folder
+
+
+def time_load(paths, workers):
+    xml_parser.cache.clear()
+    start = time.perf_counter()
+    program_manager.load_files(paths, use_disk_cache=False, workers=workers)
+    elapsed = time.perf_counter() - start
+    rows = sum(len(tx) for tx in program_manager.transaction_cache.values())
+    return elapsed, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=16, help="number of XML files to ingest")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="largest pool size to try")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per setting; the best is reported")
+    args = parser.parse_args(argv)
+
+    folder = make_folder(args.files)
+    try:
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder))
+        settings = [("serial", None)] + [(f"{n} worker(s)", n) for n in range(1, args.max_workers + 1)]
+
+        baseline = None
+        print(f"{'mode':<14}{'seconds':>10}{'rows/s':>14}{'speedup':>10}")
+        for label, workers in settings:
+            elapsed, rows = min(time_load(paths, workers) for _ in range(args.repeat))
+            baseline = baseline or elapsed
+            print(f"{label:<14}{elapsed:>10.3f}{rows / elapsed:>14,.0f}{baseline / elapsed:>9.2f}x")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
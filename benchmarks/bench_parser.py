@@ -0,0 +1,58 @@
+# benchmarks/bench_parser.py
+"""Compare the XML parser engines on one file: rows/sec, speedup, and identical output.
+
+    python benchmarks/bench_parser.py --repeat 5
+    python benchmarks/bench_parser.py path/to/settlement.xml
+
+Defaults to the 10k-row sample in xml_files/. "etree" is the original
+row-by-row reader; every other engine is checked against its table.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xml_parser
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xml_files", "transactions_10000.xml")
+
+
+def time_engine(path, engine, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        table = xml_parser._parse_file(os.path.abspath(path), engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, table
+
+
+def same_table(a, b):
+    for col in ("batch_date", "card_type"):
+        x, y = getattr(a, col), getattr(b, col)
+        if list(x.categories) != list(y.categories) or not np.array_equal(x.codes, y.codes):
+            return False
+    return all(np.array_equal(getattr(a, col), getattr(b, col)) for col in ("quantity", "gross", "net", "fee"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=SAMPLE, help="XML file to parse")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per engine; the best is reported")
+    args = parser.parse_args(argv)
+
+    baseline, reference = time_engine(args.path, "etree", args.repeat)
+
+    print(f"{'engine':<10}{'seconds':>10}{'rows/s':>14}{'speedup':>10}  output")
+    for engine in reversed(xml_parser.ENGINES):
+        elapsed, table = (baseline, reference) if engine == "etree" else time_engine(args.path, engine, args.repeat)
+        same = "identical" if same_table(table, reference) else "DIFFERENT"
+        print(f"{engine:<10}{elapsed:>10.3f}{len(table) / elapsed:>14,.0f}{baseline / elapsed:>9.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
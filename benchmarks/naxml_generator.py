@@ -0,0 +1,94 @@
+# benchmarks/naxml_generator.py
+"""Synthetic NAXML-FuelsDoc settlement files shaped like xml_files/transactions_10000.xml.
+
+    python benchmarks/naxml_generator.py out_dir --files 4 --batches 250 --cards 10
+
+Each file holds one Account with `batches` Batch elements; each Batch has a
+BatchDate and `cards` CardType rows carrying quantity/grossAmount/netAmount
+attributes and a nested AllowanceOrCharge/ChargeAmt fee. Output is written
+as a stream, so files of any size can be generated in constant memory.
+"""
+import argparse
+import datetime
+import os
+import random
+
+CARD_TYPES = [
+    "AMERICAN EXPRESS", "DEBIT CARD", "DISCOVER", "EBT FOOD STAMP",
+    "MASTERCARD", "VISA", "WEX FLEET",
+]
+
+
+def _card_rows(rng, cards):
+    for _ in range(cards):
+        quantity = rng.randint(1, 12)
+        gross = round(rng.uniform(5, 60) * quantity, 2)
+        fee = round(gross * rng.uniform(0.005, 0.04), 2)
+        yield rng.choice(CARD_TYPES), quantity, gross, round(gross - fee, 2), fee
+
+
+def generate_file(path, batches, cards, start_date=datetime.date(2020, 1, 1), batches_per_day=8, seed=0):
+    """ Write one settlement file; returns the number of CardType rows written. """
+    rng = random.Random(seed)
+    rows = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<NAXML-FuelsDoc>")
+        f.write(f"<TransmissionHeader><TransmissionId>{seed:04d}</TransmissionId>"
+                f"<TransmissionDate>{start_date.isoformat()}</TransmissionDate>"
+                "<TransmissionTime>21:38:49-05:00</TransmissionTime>"
+                "<TransmissionStatus actionType=\"original\" /></TransmissionHeader>")
+        f.write("<CreditCardsProcessed><TotalCreditCardsNetAmt identType=\"Credit\" amount=\"0\" />")
+        f.write(f"<Account identType=\"Location\" ident=\"{65154361 + seed}\"><TotalAccountAmt amount=\"0\" />")
+
+        for number in range(batches):
+            date = start_date + datetime.timedelta(days=number // batches_per_day)
+            card_rows = list(_card_rows(rng, cards))
+            parts = [
+                "<Batch identType=\"Automated\">",
+                f"<BatchNumber>{number + 1}</BatchNumber><TerminalId>{number % batches_per_day + 1}</TerminalId>",
+                f"<BatchDate>{date.isoformat()}</BatchDate>",
+                f"<TotalBatchAmt amount=\"{sum(r[2] for r in card_rows):.2f}\" quantity=\"{sum(r[1] for r in card_rows)}\" />",
+            ]
+            for card_type, quantity, gross, net, fee in card_rows:
+                parts.append(
+                    f"<CardType quantity=\"{quantity}\" grossAmount=\"{gross}\" netAmount=\"{net}\" identType=\"{card_type}\">"
+                    "<AllowanceOrCharge><AllowanceOrChargeReason>Processing Fee</AllowanceOrChargeReason>"
+                    f"<ChargeAmt UOMBasis=\"TranAmt\">{fee}</ChargeAmt></AllowanceOrCharge></CardType>"
+                )
+            parts.append("</Batch>")
+            f.write("".join(parts))
+            rows += cards
+
+        f.write("</Account></CreditCardsProcessed></NAXML-FuelsDoc>\n")
+    return rows
+
+
+def generate_dataset(folder, files, batches, cards, batches_per_day=8, seed=0):
+    """ Write `files` settlement files into folder, each covering the next stretch of dates. """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    days_per_file = -(-batches // batches_per_day)
+    for i in range(files):
+        path = os.path.join(folder, f"settlement_{i:04d}.xml")
+        start = datetime.date(2020, 1, 1) + datetime.timedelta(days=i * days_per_file)
+        generate_file(path, batches, cards, start_date=start, batches_per_day=batches_per_day, seed=seed + i)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folder")
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--batches", type=int, default=1000, help="Batch elements per file")
+    parser.add_argument("--cards", type=int, default=10, help="CardType rows per batch")
+    parser.add_argument("--batches-per-day", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    paths = generate_dataset(args.folder, args.files, args.batches, args.cards, args.batches_per_day, args.seed)
+    print(f"Wrote {len(paths)} file(s), {args.files * args.batches * args.cards:,} card rows, to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# benchmarks/run_benchmarks.py
+"""Reproducible benchmark suite: parse, ingest, archive, views, edit overlay and exports on synthetic data.
+
+    python benchmarks/run_benchmarks.py --sizes 10k,100k,1M --output baseline.json
+    python benchmarks/run_benchmarks.py --sizes 10k,100k,1M --baseline baseline.json
+
+Datasets are generated with naxml_generator (fixed seed) into --data-dir and
+reused on later runs. Every stage is timed --repeat times (best kept), then
+run once more under tracemalloc to record its peak Python/numpy allocation.
+Process-pool ingest only traces the parent, so its peak excludes workers.
+
+With --baseline, each stage slower than baseline * (1 + --tolerance) is
+reported as a regression and the exit status is 1.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import naxml_generator
+
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+CARDS_PER_BATCH = 10
+# Each file covers at most this many days, so report size stays bounded as rows grow.
+DAYS_PER_FILE = 365
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+
+def size_label(rows):
+    for suffix, factor in (("M", 1_000_000), ("k", 1_000)):
+        if rows >= factor and rows % factor == 0:
+            return f"{rows // factor}{suffix}"
+    return str(rows)
+
+
+def dataset(data_dir, rows, files, seed=0):
+    """ Paths of a generated dataset of about `rows` card rows, generating it if missing. """
+    batches = max(1, -(-rows // (files * CARDS_PER_BATCH)))
+    batches_per_day = max(8, -(-batches // DAYS_PER_FILE))
+    folder = os.path.join(data_dir, f"{size_label(rows)}_{files}f_s{seed}")
+    manifest = os.path.join(folder, "manifest.json")
+    spec = {"rows": rows, "files": files, "batches": batches, "cards": CARDS_PER_BATCH,
+            "batches_per_day": batches_per_day, "seed": seed}
+
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            if json.load(f).get("spec") == spec:
+                return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".xml"))
+    shutil.rmtree(folder, ignore_errors=True)
+
+    start = time.perf_counter()
+    paths = naxml_generator.generate_dataset(folder, files, batches, CARDS_PER_BATCH, batches_per_day, seed)
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump({"spec": spec, "generated_seconds": round(time.perf_counter() - start, 3)}, f, indent=2)
+    return paths
+
+
+def measure(fn, repeat, trace_memory):
+    """ Best wall time over `repeat` runs, plus the traced peak of one extra run. """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    result = {"seconds": round(best, 6)}
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_size(paths, args, workdir):
+    """ Run every stage on one dataset; returns {stage: {"seconds", "peak_mb", ...}}. """
+    import edit_db
+    import edit_overlay
+    import parse_cache
+    import program_manager
+    import report_analyzer
+    import xml_parser
+    from excel_exporter import export_to_excel
+    from pdf_exporter import export_to_pdf
+
+    results = {}
+    # The previous size deleted its edit database and journal; forget what was read from them.
+    edit_overlay.invalidate()
+    edit_db.reset_state()
+
+    def stage(name, fn, **extra):
+        results[name] = dict(measure(fn, args.repeat, not args.no_memory), **extra)
+        print(f"  {name:<16}{results[name]['seconds']:>10.3f} s"
+              + (f"{results[name]['peak_mb']:>10.1f} MB" if "peak_mb" in results[name] else ""))
+
+    def parse():
+        xml_parser.cache.clear()
+        xml_parser.parse_files(paths)
+
+    def ingest(use_disk_cache, workers):
+        xml_parser.cache.clear()
+        program_manager.load_files(paths, use_disk_cache=use_disk_cache, workers=workers)
+
+    def aggregate():
+        program_manager.all_files_aggregate = None
+        program_manager.edited_cache.clear()
+        return program_manager.get_aggregate("All Files")
+
+    stage("parse", parse)
+    stage("ingest", lambda: ingest(False, args.workers), workers=args.workers)
+    ingest(True, args.workers)  # warm the on-disk parse cache
+    stage("ingest.cached", lambda: ingest(True, None))
+    archive = os.path.join(workdir, "archive")
+    stage("archive.write", lambda: program_manager.archive_files(archive))
+    stage("ingest.archive", lambda: program_manager.load_archive(archive))
+    ingest(True, None)
+    rows = sum(len(tx) for tx in program_manager.transaction_cache.values())
+
+    stage("aggregate", aggregate)
+    daily = program_manager.get_aggregate("All Files")
+    stage("view.ebt", lambda: report_analyzer.ebt_summary_report(daily))
+    stage("view.group", lambda: report_analyzer.group_by_date_with_summary(daily))
+    stage("view.totals", lambda: report_analyzer.group_by_date_totals_only(daily))
+    stage("view.weekly", lambda: report_analyzer.period_totals_report(daily, "week"))
+    stage("view.monthly", lambda: report_analyzer.period_totals_report(daily, "month"))
+    stage("view.mix", lambda: report_analyzer.card_type_mix_report(daily))
+
+    # Edit a spread of (file, date, card type) cells, then time re-aggregating with them applied.
+    frame = program_manager.aggregate_cache
+    edits = []
+    for filename, partial in frame.items():
+        cells = partial.frame.iloc[::max(1, len(partial.frame) * len(frame) // args.edits)]
+        edits += [(filename, date, card, "gross", 1.0) for date, card in zip(cells["Date"], cells["Card Type"])]
+    edit_db.save_edits(edits[:args.edits])
+    stage("overlay", aggregate, edits=min(len(edits), args.edits))
+
+    report = report_analyzer.group_by_date_with_summary(program_manager.get_aggregate("All Files"))
+    if len(report) <= args.export_max_rows:
+        stage("export.excel", lambda: export_to_excel(report, os.path.join(workdir, "report.xlsx")), rows=len(report))
+        stage("export.pdf", lambda: export_to_pdf(report, os.path.join(workdir, "report.pdf")), rows=len(report))
+    else:
+        print(f"  exports skipped: report has {len(report):,} rows (> --export-max-rows)")
+
+    edit_db.close_db()
+    parse_cache.close_cache()
+    for name in (edit_db.DB_FILE, edit_db.JOURNAL_FILE, parse_cache.CACHE_DB):
+        if os.path.exists(name):
+            os.remove(name)
+    results["_rows"] = rows
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """ Stages slower than baseline by more than tolerance, as printable lines. """
+    regressions = []
+    for size, stages in results.items():
+        for name, current in stages.items():
+            before = baseline.get(size, {}).get(name)
+            if name.startswith("_") or not before:
+                continue
+            limit = max(before["seconds"] * (1 + tolerance), min_seconds)
+            if current["seconds"] > limit:
+                regressions.append(f"{size} {name}: {before['seconds']:.3f} s -> {current['seconds']:.3f} s "
+                                   f"({current['seconds'] / before['seconds']:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated row counts, e.g. 10k,100k,1M,10M")
+    parser.add_argument("--files", type=int, default=4, help="XML files per dataset")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for the ingest stage")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage; the best is kept")
+    parser.add_argument("--edits", type=int, default=1000, help="saved edits applied in the overlay stage")
+    parser.add_argument("--export-max-rows", type=int, default=100_000, help="skip exports of larger reports")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory run")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "card_viewer_bench"),
+                        help="where generated datasets are kept between runs")
+    parser.add_argument("-o", "--output", help="write results as JSON (e.g. to use as a baseline)")
+    parser.add_argument("--baseline", help="compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="ignore regressions below this time")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    data_dir = os.path.abspath(args.data_dir)
+
+    # The parse cache and edit database are relative paths; keep them out of the checkout.
+    workdir = tempfile.mkdtemp(prefix="bench_run_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = {}
+    try:
+        for rows in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            paths = dataset(data_dir, rows, args.files)
+            print(f"{size_label(rows)} rows ({len(paths)} files)")
+            results[size_label(rows)] = run_size(paths, args, workdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    import numpy
+    import pandas
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pandas.__version__,
+            "numpy": numpy.__version__,
+            "repeat": args.repeat,
+            "files": args.files,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,40 @@
 import sqlite3
 import os
 import json
+import atexit
+import threading
+from contextlib import contextmanager
+from instrumentation import timed
 
 DB_FILE = "user_edits.db"
-JSON_BACKUP = "backup_edits.json"
+JSON_BACKUP = "backup_edits.json"  # legacy full-rewrite backup, still read as a fallback
+JOURNAL_FILE = "edits_journal.jsonl"
+# Compact the journal once it holds this many records more than the live edits.
+COMPACT_THRESHOLD = 5000
 
+UPSERT_SQL = '''
+    INSERT OR REPLACE INTO edits (filename, date, card_type, field, value)
+    VALUES (?, ?, ?, ?, ?)
+'''
 
-def init_db():
-    """Initialize the user edits database and table if it doesn't exist."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+# One long-lived WAL connection shared by every call; writes inside
+# batch_edits() are committed (and journaled) once at the end of the block.
+_conn = None
+_conn_path = None
+_lock = threading.RLock()
+_batch_depth = 0
+_pending_journal = []
+_journal_lock = threading.Lock()
+_journal_records = None
+_journal_live = 0
+_compacting = False
+# Files touched since the last commit, and callbacks told about them once it lands.
+_changed_files = set()
+_change_listeners = []
+
+
+def _create_table(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS edits (
             filename TEXT,
             date TEXT,
@@ -20,47 +44,224 @@ def init_db():
             PRIMARY KEY (filename, date, card_type, field)
         )
     ''')
-    conn.commit()
-    conn.close()
 
 
-def save_edit(filename, date, card_type, field, value):
-    """Save or update a cell edit into the database and backup JSON."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO edits (filename, date, card_type, field, value)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (filename, date, card_type, field, str(value)))
-    conn.commit()
-    conn.close()
+def get_connection():
+    """Return the shared connection, (re)opening it if DB_FILE changed."""
+    global _conn, _conn_path
+    with _lock:
+        if _conn is None or _conn_path != DB_FILE:
+            close_db()
+            _conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _create_table(_conn)
+            _conn.commit()
+            _conn_path = DB_FILE
+        return _conn
 
-    try:
-        if os.path.exists(JSON_BACKUP):
-            with open(JSON_BACKUP, "r") as f:
-                backup_data = json.load(f)
+
+def close_db():
+    """Flush pending work and close the shared connection."""
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None:
+            _conn.commit()
+            _conn.close()
+        _conn = None
+        _conn_path = None
+
+
+atexit.register(close_db)
+
+
+def reset_state():
+    """Close the connection and forget the journal counts, e.g. after DB_FILE or the journal was deleted."""
+    global _journal_records, _journal_live
+    close_db()
+    with _journal_lock:
+        _journal_records = None
+        _journal_live = 0
+
+
+def _commit():
+    if not _batch_depth:
+        get_connection().commit()
+        _flush_journal()
+        _notify_changes()
+
+
+def add_change_listener(callback):
+    """Call callback(filenames) after every commit that saved or deleted edits for those files."""
+    _change_listeners.append(callback)
+
+
+def _notify_changes():
+    if not _changed_files:
+        return
+    filenames = frozenset(_changed_files)
+    _changed_files.clear()
+    for callback in _change_listeners:
+        try:
+            callback(filenames)
+        except Exception as e:
+            print(f"Warning: edit listener failed: {e}")
+
+
+@contextmanager
+def batch_edits():
+    """Group many edits into one transaction: a single commit and journal append for the block."""
+    global _batch_depth
+    with _lock:
+        conn = get_connection()
+        _batch_depth += 1
+        try:
+            yield conn
+        except Exception:
+            _batch_depth -= 1
+            if not _batch_depth:
+                conn.rollback()
+                _pending_journal.clear()
+                _changed_files.clear()
+            raise
         else:
-            backup_data = {}
+            _batch_depth -= 1
+            _commit()
+
+
+def init_db():
+    """Initialize the user edits database and table if it doesn't exist."""
+    get_connection()
+
 
-        key = f"{filename}::{date}::{card_type}::{field}"
-        backup_data[key] = str(value)
+def _journal_record(op, filename, date, card_type, field, value=None):
+    record = {"op": op, "filename": filename, "date": date, "card_type": card_type, "field": field}
+    if op == "save":
+        record["value"] = value
+    return record
 
-        with open(JSON_BACKUP, "w") as f:
-            json.dump(backup_data, f, indent=2)
+
+def _flush_journal():
+    """Append pending edit records to the journal; cost depends only on the edits being written."""
+    global _journal_records, _journal_live
+    if not _pending_journal:
+        return
+    try:
+        with _journal_lock:
+            with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in _pending_journal))
+            if _journal_records is None:
+                # First write in this process: the table already holds every live edit,
+                # so a journal of live records alone never looks due for compaction.
+                _journal_records = _count_lines(JOURNAL_FILE)
+                _journal_live = get_connection().execute("SELECT COUNT(*) FROM edits").fetchone()[0]
+            else:
+                _journal_records += len(_pending_journal)
+            needs_compaction = _journal_records - _journal_live > COMPACT_THRESHOLD
     except Exception as e:
-        print(f"Warning: Failed to write JSON backup: {e}")
+        print(f"Warning: Failed to write edit journal: {e}")
+        needs_compaction = False
+    finally:
+        _pending_journal.clear()
+
+    if needs_compaction:
+        _compact_in_background()
+
+
+def _count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def _replay_journal(journal_path=None):
+    """Rebuild {(filename, date, card_type, field): value} from the legacy backup and the journal."""
+    journal_path = journal_path or JOURNAL_FILE
+    edits = {}
+
+    if os.path.abspath(journal_path) == os.path.abspath(JOURNAL_FILE) and os.path.exists(JSON_BACKUP):
+        with open(JSON_BACKUP, "r") as f:
+            for key, value in json.load(f).items():
+                parts = key.split("::")
+                if len(parts) == 4:
+                    edits[tuple(parts)] = value
+
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; everything before it is intact.
+                    continue
+                key = (record["filename"], record["date"], record["card_type"], record["field"])
+                if record["op"] == "delete":
+                    edits.pop(key, None)
+                else:
+                    edits[key] = record["value"]
+    return edits
+
+
+def compact_journal():
+    """Rewrite the journal as one save record per live edit."""
+    global _journal_records, _journal_live
+    with _journal_lock:
+        edits = _replay_journal()
+        tmp_path = JOURNAL_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (filename, date, card_type, field), value in edits.items():
+                f.write(json.dumps(_journal_record("save", filename, date, card_type, field, value)) + "\n")
+        os.replace(tmp_path, JOURNAL_FILE)
+        if os.path.exists(JSON_BACKUP):
+            os.remove(JSON_BACKUP)
+        _journal_records = _journal_live = len(edits)
+
+
+def _compact_in_background():
+    global _compacting
+    if _compacting:
+        return
+    _compacting = True
+
+    def run():
+        global _compacting
+        try:
+            compact_journal()
+        except Exception as e:
+            print(f"Warning: Failed to compact edit journal: {e}")
+        finally:
+            _compacting = False
+
+    threading.Thread(target=run, name="edit-journal-compaction", daemon=True).start()
+
+
+def save_edit(filename, date, card_type, field, value):
+    """Save or update a cell edit into the database and the edit journal."""
+    save_edits([(filename, date, card_type, field, value)])
 
 
+@timed("edit_db.save_edits", rows=lambda result, edits, *a, **k: len(edits) if hasattr(edits, "__len__") else None)
+def save_edits(edits):
+    """Save many (filename, date, card_type, field, value) edits with one executemany and one commit."""
+    rows = [(filename, date, card_type, field, str(value)) for filename, date, card_type, field, value in edits]
+    if not rows:
+        return
+    with _lock:
+        get_connection().executemany(UPSERT_SQL, rows)
+        _pending_journal.extend(_journal_record("save", *row) for row in rows)
+        _changed_files.update(row[0] for row in rows)
+        _commit()
+
+
+@timed("edit_db.get_edits_for_file", rows=lambda result, *a, **k: len(result))
 def get_edits_for_file(filename):
     """Retrieve all edits for a specific file from DB, fallback to JSON if DB fails."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT date, card_type, field, value FROM edits WHERE filename = ?
-        ''', (filename,))
-        rows = cursor.fetchall()
-        conn.close()
+        with _lock:
+            rows = get_connection().execute('''
+                SELECT date, card_type, field, value FROM edits WHERE filename = ?
+            ''', (filename,)).fetchall()
 
         return {
             (date, card_type, field): value
@@ -68,52 +269,55 @@ def get_edits_for_file(filename):
         }
 
     except Exception as db_err:
-        print(f"DB error: {db_err}. Trying JSON backup...")
+        print(f"DB error: {db_err}. Replaying edit journal...")
 
-        if not os.path.exists(JSON_BACKUP):
+        try:
+            with _journal_lock:
+                edits = _replay_journal()
+            return {
+                (date, card_type, field): value
+                for (name, date, card_type, field), value in edits.items()
+                if name == filename
+            }
+        except Exception as json_err:
+            print(f"Journal recovery failed: {json_err}")
             return {}
 
-        try:
-            with open(JSON_BACKUP, "r") as f:
-                raw_data = json.load(f)
 
-            if isinstance(raw_data, dict):
-                # Backup from save_edit()
-                return {
-                    tuple(key.split("::")[1:]): val
-                    for key, val in raw_data.items()
-                    if key.startswith(f"{filename}::")
-                }
-            else:
-                # Imported full backup from export
-                return {
-                    (item["date"], item["card_type"], item["field"]): item["value"]
-                    for item in raw_data
-                    if item.get("filename") == filename
-                }
+@timed("edit_db.get_all_edits", rows=lambda result, *a, **k: len(result))
+def get_all_edits():
+    """Return every edit as (filename, date, card_type, field, value) rows, fallback to the journal if DB fails."""
+    try:
+        with _lock:
+            return get_connection().execute("SELECT filename, date, card_type, field, value FROM edits").fetchall()
+
+    except Exception as db_err:
+        print(f"DB error: {db_err}. Replaying edit journal...")
+
+        try:
+            with _journal_lock:
+                edits = _replay_journal()
+            return [(name, date, card_type, field, value) for (name, date, card_type, field), value in edits.items()]
         except Exception as json_err:
-            print(f"JSON recovery failed: {json_err}")
-            return {}
+            print(f"Journal recovery failed: {json_err}")
+            return []
 
 
+@timed("edit_db.delete_edit")
 def delete_edit(filename, date, card_type, field):
     """Remove a specific edit from the database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        DELETE FROM edits WHERE filename = ? AND date = ? AND card_type = ? AND field = ?
-    ''', (filename, date, card_type, field))
-    conn.commit()
-    conn.close()
+    with _lock:
+        get_connection().execute('''
+            DELETE FROM edits WHERE filename = ? AND date = ? AND card_type = ? AND field = ?
+        ''', (filename, date, card_type, field))
+        _pending_journal.append(_journal_record("delete", filename, date, card_type, field))
+        _changed_files.add(filename)
+        _commit()
 
 
 def export_edits_to_json(json_path="user_edits.json"):
     """Export all database edits into a structured JSON array."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT filename, date, card_type, field, value FROM edits")
-    edits = cursor.fetchall()
-    conn.close()
+    edits = get_all_edits()
 
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump([
@@ -128,49 +332,60 @@ def export_edits_to_json(json_path="user_edits.json"):
         ], f, indent=2)
 
 
+@timed("edit_db.import_edits", nbytes=lambda result, json_path="user_edits.json", *a, **k: os.path.getsize(json_path))
 def import_edits_from_json(json_path="user_edits.json"):
-    """Import edits from JSON. Handles both dict and list format."""
+    """Import edits from JSON. Handles dict and list format, and replays .jsonl edit journals."""
     if not os.path.exists(json_path):
         raise FileNotFoundError("JSON file not found")
 
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
-
-        if isinstance(raw_data, dict):
-            # Convert dict format (from backup_edits.json) to list
-            edits = []
-            for key, value in raw_data.items():
-                parts = key.split("::")
-                if len(parts) == 4:
-                    filename, date, card_type, field = parts
-                    edits.append({
-                        "filename": filename,
-                        "date": date,
-                        "card_type": card_type,
-                        "field": field,
-                        "value": value
-                    })
+        if json_path.endswith(".jsonl"):
+            # Edit journal: replay it down to the final value of every key.
+            with _journal_lock:
+                replayed = _replay_journal(json_path)
+            edits = [
+                {"filename": filename, "date": date, "card_type": card_type, "field": field, "value": value}
+                for (filename, date, card_type, field), value in replayed.items()
+            ]
         else:
-            edits = raw_data
+            with open(json_path, "r", encoding="utf-8") as f:
+                raw_data = json.load(f)
+
+            if isinstance(raw_data, dict):
+                # Convert dict format (from backup_edits.json) to list
+                edits = []
+                for key, value in raw_data.items():
+                    parts = key.split("::")
+                    if len(parts) == 4:
+                        filename, date, card_type, field = parts
+                        edits.append({
+                            "filename": filename,
+                            "date": date,
+                            "card_type": card_type,
+                            "field": field,
+                            "value": value
+                        })
+            else:
+                edits = raw_data
 
     except json.JSONDecodeError as e:
         raise ValueError(f"Failed to parse JSON: {e}")
     except Exception as e:
         raise RuntimeError(f"Unexpected error while loading JSON: {e}")
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    for e in edits:
-        cursor.execute('''
-            INSERT OR REPLACE INTO edits (filename, date, card_type, field, value)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (e["filename"], e["date"], e["card_type"], e["field"], str(e["value"])))
-    conn.commit()
-    conn.close()
+    rows = [(e["filename"], e["date"], e["card_type"], e["field"], str(e["value"])) for e in edits]
+    with _lock:
+        get_connection().executemany(UPSERT_SQL, rows)
+        _pending_journal.extend(_journal_record("save", *row) for row in rows)
+        _changed_files.update(row[0] for row in rows)
+        _commit()
 
 
 def clear_json_backup():
-    if os.path.exists(JSON_BACKUP):
-        os.remove(JSON_BACKUP)
-        print("JSON backup cleared.")
+    global _journal_records, _journal_live
+    with _journal_lock:
+        for path in (JSON_BACKUP, JOURNAL_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        _journal_records = _journal_live = 0
+    print("JSON backup cleared.")
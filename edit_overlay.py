@@ -0,0 +1,91 @@
+# edit_overlay.py
+import pandas as pd
+import edit_db
+from report_engine import DailyAggregate, MEASURES
+from transaction_table import CENTS
+
+# Edited field names as stored in edit_db -> aggregate column they override.
+FIELD_COLUMNS = {"qty": "Qty", "quantity": "Qty", "gross": "Gross", "net": "Net", "fee": "Fee"}
+
+# Bumped whenever any edit is saved or deleted; part of every cache key built on edited data.
+version = 0
+
+_by_file = None
+_stale = set()
+_listeners = []
+
+
+def _pivot(edits):
+    """ (Date, Card Type, field, value) rows -> frame indexed by (Date, Card Type), one column per field.
+
+    Edits are saved in dollars as typed; the money columns come back in cents like the aggregates.
+    """
+    df = pd.DataFrame(edits, columns=["Date", "Card Type", "field", "value"])
+    df["field"] = df["field"].str.strip().str.lower().map(FIELD_COLUMNS)
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df = df.dropna(subset=["field", "value"])
+    if df.empty:
+        return None
+    df.loc[df["field"] != "Qty", "value"] *= CENTS
+    return df.drop_duplicates(["Date", "Card Type", "field"], keep="last").set_index(
+        ["Date", "Card Type", "field"])["value"].unstack("field")
+
+
+def _load():
+    global _by_file
+    if _by_file is None:
+        rows = pd.DataFrame(edit_db.get_all_edits(), columns=["filename", "Date", "Card Type", "field", "value"])
+        _by_file = {}
+        for filename, group in rows.groupby("filename", sort=False):
+            pivot = _pivot(group.drop(columns="filename"))
+            if pivot is not None:
+                _by_file[filename] = pivot
+        _stale.clear()
+    return _by_file
+
+
+def edits_for(filename):
+    """ The indexed edits of one file, reloading only that file if its edits changed. """
+    by_file = _load()
+    if filename in _stale:
+        _stale.discard(filename)
+        rows = [(date, card_type, field, value)
+                for (date, card_type, field), value in edit_db.get_edits_for_file(filename).items()]
+        pivot = _pivot(rows)
+        if pivot is None:
+            by_file.pop(filename, None)
+        else:
+            by_file[filename] = pivot
+    return by_file.get(filename)
+
+
+def apply(aggregate, filename):
+    """ Return the aggregate with the file's edited cells swapped in, via one index join. """
+    edits = edits_for(filename)
+    if edits is None or not len(aggregate):
+        return aggregate
+
+    frame = aggregate.frame.set_index(["Date", "Card Type"]).astype({col: "float64" for col in MEASURES})
+    frame.update(edits)
+    frame[MEASURES] = frame[MEASURES].round().astype("int64")
+    return DailyAggregate(frame.reset_index())
+
+
+def add_listener(callback):
+    """ Call callback(filenames) after the overlay for those files was invalidated. """
+    _listeners.append(callback)
+
+
+def invalidate(filenames=None):
+    """ Forget the edits of the given files (all files if None) and bump the version. """
+    global version, _by_file
+    if filenames is None:
+        _by_file = None
+    else:
+        _stale.update(filenames)
+    version += 1
+    for callback in _listeners:
+        callback(filenames)
+
+
+edit_db.add_change_listener(invalidate)
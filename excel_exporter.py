@@ -1,29 +1,60 @@
 
-
+import os
 import pandas as pd
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils import get_column_letter
+from instrumentation import timed
+
+def column_widths(df: pd.DataFrame):
+    """ Auto-fit widths from the frame itself: longest header or cell text per column, plus padding. """
+    widths = []
+    for col in df.columns:
+        lengths = df[col].astype(str).str.len()
+        longest = max(len(str(col)), int(lengths.max()) if len(lengths) else 0)
+        widths.append(longest + 2)
+    return widths
+
+def _write_sheet(wb: Workbook, df: pd.DataFrame, title: str):
+    ws = wb.create_sheet(title=title[:31])
+
+    # Widths must be set before the first row is streamed out.
+    for idx, width in enumerate(column_widths(df), 1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+    bold = Font(bold=True)
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    # tolist() hands openpyxl native Python values, which it writes fastest.
+    for row in zip(*(df[col].tolist() for col in df.columns)):
+        ws.append(row)
 
 def export_to_excel(df: pd.DataFrame, file_path: str):
-  
+
     if df.empty:
         raise ValueError("The DataFrame is empty. Nothing to export.")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Report"
+    export_sheets_to_excel({"Report": df}, file_path)
 
-    # Write data from DataFrame
-    for row_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        ws.append(row)
-        if row_idx == 1:  # Bold header
-            for cell in ws[row_idx]:
-                cell.font = Font(bold=True)
-
-    # Auto-fit column widths
-    for col in ws.columns:
-        max_len = max((len(str(cell.value)) if cell.value is not None else 0) for cell in col)
-        ws.column_dimensions[col[0].column_letter].width = max_len + 2
+@timed("export.excel", rows=lambda result, frames, *a, **k: sum(len(df) for df in frames.values()),
+       nbytes=lambda result, frames, file_path, *a, **k: os.path.getsize(file_path))
+def export_sheets_to_excel(frames: dict, file_path: str):
+    """ Stream several reports into one workbook, one sheet per entry (e.g. per file or per month).
+
+    Uses a write-only workbook, so rows go straight to disk and memory stays
+    bounded however many rows or sheets are written.
+    """
+    if not frames or all(df.empty for df in frames.values()):
+        raise ValueError("The DataFrame is empty. Nothing to export.")
+
+    wb = Workbook(write_only=True)
+    for title, df in frames.items():
+        _write_sheet(wb, df, str(title))
 
     wb.save(file_path)
@@ -0,0 +1,125 @@
+# folder_watcher.py
+import os
+import threading
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # optional; without it the folder is simply re-scanned on every poll
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class FolderWatcher:
+    """ Reports XML files that appear, change or disappear in a folder.
+
+    poll() compares each file's (size, mtime) with what was last reported and
+    only hands a file over once that signature has stayed the same for `settle`
+    seconds, so a file the POS is still writing is not parsed half-written.
+    With the watchdog package installed, OS file events (inotify and friends)
+    mark the folder dirty and idle polls skip the directory scan; a full scan
+    still runs every `rescan` seconds in case an event was missed.
+
+    poll() is meant to be called from one thread (the Tk loop); only the
+    watchdog observer runs on its own thread.
+    """
+
+    def __init__(self, folder, suffix=".xml", settle=1.5, rescan=30.0):
+        self.folder = folder
+        self.suffix = suffix.lower()
+        self.settle = settle
+        self.rescan = rescan
+        self.known = {}
+        self.pending = {}
+        self.last_scan = 0.0
+        self._dirty = threading.Event()
+        self._observer = None
+
+    def start(self):
+        """ Take the folder as it is now as already loaded, and start OS events if available. """
+        self.known = self.scan()
+        self.pending.clear()
+        self.last_scan = time.monotonic()
+        if Observer is not None and self._observer is None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_DirtyFlag(self._dirty), self.folder, recursive=False)
+                self._observer.daemon = True
+                self._observer.start()
+            except Exception as e:
+                print(f"Warning: file events unavailable, polling {self.folder}: {e}")
+                self._observer = None
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def scan(self):
+        """ {file name: (size, mtime_ns)} of the matching files in the folder. """
+        signatures = {}
+        try:
+            entries = os.scandir(self.folder)
+        except OSError:
+            return signatures
+        with entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(self.suffix):
+                    continue
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue  # deleted between listing and stat
+        return signatures
+
+    def mark_seen(self, name):
+        """ Record a file the app loaded itself (e.g. "Add XML File") so it is not reported again. """
+        path = os.path.join(self.folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        self.known[name] = (stat.st_size, stat.st_mtime_ns)
+        self.pending.pop(name, None)
+
+    def poll(self, now=None):
+        """ (new or changed file names that have settled, removed file names) since the last poll. """
+        now = time.monotonic() if now is None else now
+        if (self._observer is not None and not self._dirty.is_set() and not self.pending
+                and now - self.last_scan < self.rescan):
+            return [], []
+        self._dirty.clear()
+        self.last_scan = now
+        current = self.scan()
+
+        removed = [name for name in self.known if name not in current]
+        for name in removed:
+            del self.known[name]
+        for name in [name for name in self.pending if name not in current]:
+            del self.pending[name]
+
+        changed = []
+        for name, signature in current.items():
+            if self.known.get(name) == signature:
+                self.pending.pop(name, None)
+                continue
+            seen = self.pending.get(name)
+            if seen is None or seen[0] != signature:
+                self.pending[name] = (signature, now)  # new or still growing: wait for it to settle
+            elif now - seen[1] >= self.settle:
+                changed.append(name)
+                self.known[name] = signature
+                del self.pending[name]
+        return changed, removed
+
+
+class _DirtyFlag(FileSystemEventHandler):
+    def __init__(self, flag):
+        super().__init__()
+        self.flag = flag
+
+    def on_any_event(self, event):
+        self.flag.set()
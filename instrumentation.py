@@ -0,0 +1,216 @@
+# instrumentation.py
+"""Timers and counters for the hot paths: parse, aggregate, render, export, edit_db.
+
+Off by default; a disabled @timed wrapper costs one flag check per call.
+Turn it on with enable() or by setting environment variables before start:
+
+    CARD_VIEWER_METRICS=metrics.jsonl   one JSON record per timed call
+    CARD_VIEWER_PROFILE=cprofile        also keep cProfile stats per stage
+    CARD_VIEWER_PROFILE=tracemalloc     also record peak traced memory per call
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = False
+LOG_FILE = None
+PROFILE = None
+PROFILE_DIR = "profiles"
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_profiles = {}
+# In a pool worker during map_recorded: records collected here go back to the parent.
+_worker_records = None
+
+
+def enable(log_file="metrics.jsonl", profile=None):
+    """ Start recording. profile may be None, "cprofile" or "tracemalloc". """
+    global ENABLED, LOG_FILE, PROFILE
+    if profile not in (None, "cprofile", "tracemalloc"):
+        raise ValueError(f"Unknown profile mode: {profile}")
+    LOG_FILE = log_file
+    PROFILE = profile
+    if profile == "tracemalloc":
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+    flush_profiles()
+
+
+def timed(stage, rows=None, nbytes=None):
+    """ Decorator: time each call as `stage`.
+
+    rows / nbytes are optional callables (result, *args, **kwargs) -> int
+    used to report how much data the call handled.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _measure(stage) as record:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    record["rows"] = _safe_count(rows, result, args, kwargs)
+                if nbytes is not None:
+                    record["bytes"] = _safe_count(nbytes, result, args, kwargs)
+            return result
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """ Bump a plain counter, e.g. cache hits. """
+    if not ENABLED:
+        return
+    if _worker_records is not None:
+        _worker_records.append({"stage": name, "calls": n})
+        return
+    with _lock:
+        stat = _stats.setdefault(name, _new_stat())
+        stat["calls"] += n
+
+
+def map_recorded(pool, fn, items):
+    """ pool.map(fn, items), adding what the workers timed and counted to this process's stats and log.
+
+    Workers do not profile; only their timings, rows and bytes come back.
+    """
+    if not ENABLED:
+        return list(pool.map(fn, items))
+    results = []
+    for result, records in pool.map(functools.partial(_recorded_call, fn), items):
+        for record in records:
+            if "seconds" in record:
+                _emit(record, record["seconds"], None)
+            else:
+                count(record["stage"], record["calls"])
+        results.append(result)
+    return results
+
+
+def _recorded_call(fn, *args):
+    global ENABLED, _worker_records
+    ENABLED = True
+    _worker_records = records = []
+    try:
+        return fn(*args), records
+    finally:
+        _worker_records = None
+
+
+def summary():
+    """ Per-stage totals since start: calls, seconds, max seconds, rows, bytes. """
+    with _lock:
+        return {stage: dict(stat) for stage, stat in _stats.items()}
+
+
+def write_summary(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary(), f, indent=2)
+
+
+def flush_profiles():
+    """ Write accumulated cProfile stats as <PROFILE_DIR>/<stage>.prof. """
+    with _lock:
+        profiles = dict(_profiles)
+        _profiles.clear()
+    if not profiles:
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    for stage, stats in profiles.items():
+        stats.dump_stats(os.path.join(PROFILE_DIR, f"{stage}.prof"))
+
+
+def _new_stat():
+    return {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "bytes": 0}
+
+
+def _safe_count(fn, result, args, kwargs):
+    try:
+        return int(fn(result, *args, **kwargs))
+    except Exception:
+        return None
+
+
+class _measure:
+    def __init__(self, stage):
+        self.stage = stage
+        self.record = {"stage": stage}
+        self.profiler = None
+        self.traced_before = None
+
+    def __enter__(self):
+        # One cProfile profiler per thread and one tracemalloc peak, so only the outermost stage captures.
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        if PROFILE == "cprofile" and depth == 0:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif PROFILE == "tracemalloc" and depth == 0:
+            import tracemalloc
+            self.traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _local.depth -= 1
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.traced_before is not None:
+            import tracemalloc
+            self.record["peak_bytes"] = tracemalloc.get_traced_memory()[1] - self.traced_before
+
+        self.record["seconds"] = round(seconds, 6)
+        self.record["ts"] = round(time.time(), 3)
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        _emit(self.record, seconds, self.profiler)
+        return False
+
+
+def _emit(record, seconds, profiler):
+    if _worker_records is not None:
+        _worker_records.append(record)
+        return
+    with _lock:
+        stat = _stats.setdefault(record["stage"], _new_stat())
+        stat["calls"] += 1
+        stat["seconds"] += seconds
+        stat["max_seconds"] = max(stat["max_seconds"], seconds)
+        stat["rows"] += record.get("rows") or 0
+        stat["bytes"] += record.get("bytes") or 0
+
+        if profiler is not None:
+            import pstats
+            if record["stage"] in _profiles:
+                _profiles[record["stage"]].add(profiler)
+            else:
+                _profiles[record["stage"]] = pstats.Stats(profiler)
+
+        if LOG_FILE:
+            try:
+                with open(LOG_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"Warning: could not write metrics: {e}")
+
+
+if os.environ.get("CARD_VIEWER_METRICS") or os.environ.get("CARD_VIEWER_PROFILE"):
+    enable(os.environ.get("CARD_VIEWER_METRICS") or "metrics.jsonl", os.environ.get("CARD_VIEWER_PROFILE") or None)
+
+atexit.register(flush_profiles)
@@ -1,15 +1,38 @@
 #designed and developed by prem patel
+from startup_timing import StartupTimer
+startup = StartupTimer()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 import sys
 import shutil
-import pandas as pd
+import datetime
+import multiprocessing
+from collections import deque
 from tksheet import Sheet
-from program_manager import add_file_to_cache, get_transactions
-from report_analyzer import group_by_date_with_summary, group_by_date_totals_only, ebt_summary_report
-from pdf_exporter import export_to_pdf
-from excel_exporter import export_to_excel
+from sheet_feed import SheetDataFeed
+from task_runner import BackgroundTasks
+from folder_watcher import FolderWatcher
+import instrumentation
+# pandas, the report modules and the exporters (reportlab, openpyxl) are imported
+# on first use in the background worker, so the window can appear before they load.
+
+startup.mark("imports done")
+
+# Worker processes used to parse XML files that are not in the on-disk cache yet.
+PARSE_WORKERS = os.cpu_count() or 1
+# Reports longer than this are shown through a scrolling window instead of loaded whole.
+VIRTUAL_ROW_THRESHOLD = 2000
+ROW_HEIGHT = 28
+# Group by Date columns whose edited cells are saved to edit_db.
+EDITABLE_COLUMNS = ("Qty", "Gross", "Net", "Fee")
+# Quiet period before a burst of combo box / checkbox changes turns into one report request.
+UPDATE_DEBOUNCE_MS = 60
+# How often xml_files is checked for files dropped in, changed or deleted while the app runs.
+WATCH_INTERVAL_MS = 2000
+# Print and save the startup breakdown when run with --startup-timing or this variable set.
+SHOW_STARTUP_TIMING = "--startup-timing" in sys.argv or bool(os.environ.get("CARD_VIEWER_STARTUP_TIMING"))
 
 def get_app_base_path():
     if getattr(sys, 'frozen', False):
@@ -27,15 +50,29 @@ class TransactionViewerApp:
         os.makedirs(self.xml_folder, exist_ok=True)
 
         self.file_list = []
-        self.dataframe = pd.DataFrame()
-
-        self.setup_ui()
-        self.auto_load_existing_files()
+        self.dataframe = None
+        self.feed = None
+        self.window_start = 0
+        self.pending_update = None
+        # (file, date, card type, field, value or None to delete) waiting for the worker to save.
+        self.unsaved_edits = deque()
+        self.watcher = FolderWatcher(self.xml_folder)
+        self.syncs = 0
+
+        with startup.phase("build window"):
+            self.setup_ui()
+        self.tasks = BackgroundTasks(self.root, on_status=self.set_status)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.refresh_file_list()
 
-        if self.file_list:
-            self.file_selector.set("All Files")
-            self.update_table()
+        # Start parsing only once the window is on screen.
+        self.root.bind("<Map>", self.on_first_map, add="+")
+
+    def on_first_map(self, event):
+        if event.widget is not self.root or "window shown" in startup.marks:
+            return
+        startup.mark("window shown")
+        self.auto_load_existing_files()
 
     def setup_ui(self):
         toolbar = ttk.Frame(self.root)
@@ -48,7 +85,8 @@ class TransactionViewerApp:
         self.sort_order.bind("<<ComboboxSelected>>", lambda e: self.on_view_option_change())
 
         ttk.Label(toolbar, text="Option:").pack(side=tk.LEFT)
-        self.view_option = ttk.Combobox(toolbar, values=["With EBT food", "Group by Date", "Daily Totals"], state="readonly")
+        self.view_option = ttk.Combobox(toolbar, values=["With EBT food", "Group by Date", "Daily Totals",
+                                                           "Weekly Totals", "Monthly Totals", "Card Type Mix"], state="readonly")
         self.view_option.current(0)
         self.view_option.pack(side=tk.LEFT, padx=5)
         self.view_option.bind("<<ComboboxSelected>>", lambda e: self.on_view_option_change())
@@ -59,7 +97,7 @@ class TransactionViewerApp:
         self.file_selector.bind("<<ComboboxSelected>>", lambda e: self.on_view_option_change())
 
         self.show_totals_only = tk.BooleanVar()
-        self.totals_only_checkbox = ttk.Checkbutton(toolbar, text="Totals Only", variable=self.show_totals_only, command=self.update_table)
+        self.totals_only_checkbox = ttk.Checkbutton(toolbar, text="Totals Only", variable=self.show_totals_only, command=self.request_update)
         self.totals_only_checkbox.pack(side=tk.LEFT, padx=5)
 
         ttk.Button(toolbar, text="Add XML File", command=self.import_file).pack(side=tk.LEFT, padx=5)
@@ -71,9 +109,31 @@ class TransactionViewerApp:
         self.font_size_spin.set(11)
         self.font_size_spin.pack(side=tk.LEFT)
 
+        # Only batches dated in this range are loaded; files entirely outside it are not parsed.
+        range_bar = ttk.Frame(self.root)
+        range_bar.pack(fill=tk.X, padx=10, pady=(0, 5))
+        ttk.Label(range_bar, text="From:").pack(side=tk.LEFT)
+        self.date_from = ttk.Entry(range_bar, width=12)
+        self.date_from.pack(side=tk.LEFT, padx=5)
+        ttk.Label(range_bar, text="To:").pack(side=tk.LEFT)
+        self.date_to = ttk.Entry(range_bar, width=12)
+        self.date_to.pack(side=tk.LEFT, padx=5)
+        ttk.Label(range_bar, text="(YYYY-MM-DD)").pack(side=tk.LEFT)
+        for entry in (self.date_from, self.date_to):
+            entry.bind("<Return>", lambda e: self.apply_date_range())
+        ttk.Button(range_bar, text="Apply Dates", command=self.apply_date_range).pack(side=tk.LEFT, padx=5)
+        ttk.Button(range_bar, text="All Dates", command=self.clear_date_range).pack(side=tk.LEFT)
+
         branding = ttk.Label(self.root, text="© Sant Corporation", font=("Segoe UI", 10, "italic"))
         branding.pack(pady=(0, 5))
 
+        status_bar = ttk.Frame(self.root)
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        self.status_text = tk.StringVar(value="Ready")
+        ttk.Label(status_bar, textvariable=self.status_text).pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(status_bar, mode="indeterminate", length=160)
+        self.progress.pack(side=tk.RIGHT)
+
         self.sheet_frame = tk.Frame(self.root)
         self.sheet_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
@@ -93,21 +153,106 @@ class TransactionViewerApp:
         self.sheet.grid(row=0, column=0, sticky="nswe")
         self.sheet_frame.grid_rowconfigure(0, weight=1)
         self.sheet_frame.grid_columnconfigure(0, weight=1)
-        self.sheet.row_height("all", 28)
+        self.sheet.row_height("all", ROW_HEIGHT)
+
+        # Drives the row window when a report is too long to hand to the sheet whole.
+        self.v_scroll = ttk.Scrollbar(self.sheet_frame, orient=tk.VERTICAL, command=self.on_virtual_scroll)
+        self.sheet_frame.bind("<Configure>", lambda e: self.show_window(self.window_start, reset=True))
+        # The wheel, and arrow and page keys at the window's edge, move the window
+        # instead of stopping there; outside virtual mode tksheet handles them as usual.
+        self.add_sheet_bindtag("VirtualRows")
+        for wheel_event in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.root.bind_class("VirtualRows", wheel_event, self.on_virtual_wheel)
+        for key in ("<Up>", "<Down>", "<Prior>", "<Next>"):
+            self.root.bind_class("VirtualRows", key, self.on_virtual_key)
+        self.sheet.bind("<<SheetModified>>", self.on_sheet_modified)
+
+    def add_sheet_bindtag(self, tag):
+        """ Put tag ahead of tksheet's own bindings on the table and row index canvases.
+
+        Sheet.bind either replaces tksheet's wheel and key handlers or runs after
+        them, so there is no public way to handle an event first and pass it on.
+        This is the only place that reaches into Sheet.MT / Sheet.RI (checked
+        against tksheet 7.6.0).
+        """
+        for canvas in (self.sheet.MT, self.sheet.RI):
+            canvas.bindtags((tag,) + canvas.bindtags())
 
     def update_font_size(self):
         size = int(self.font_size_spin.get())
         self.sheet.font(newfont=("Segoe UI", size))
         self.sheet.header_font(newfont=("Segoe UI", size, "bold"))
+        if self.feed is not None:
+            self.sheet.set_column_widths(self.feed.column_widths(char_width=self.char_width()))
         self.sheet.refresh()
 
+    def char_width(self):
+        return max(6, int(self.font_size_spin.get()) * 3 // 4)
+
+    def set_status(self, busy, message=None):
+        if message:
+            self.status_text.set(message)
+        elif not busy and not self.status_text.get().startswith("Ready"):
+            self.status_text.set("Ready")
+        if busy:
+            self.progress.start(12)
+        else:
+            self.progress.stop()
+
+    def on_close(self):
+        self.watcher.stop()
+        self.tasks.shutdown()
+        self.root.destroy()
+
     def auto_load_existing_files(self):
-        for file in os.listdir(self.xml_folder):
-            if file.endswith(".xml"):
-                path = os.path.join(self.xml_folder, file)
-                add_file_to_cache(path)
-                if file not in self.file_list:
-                    self.file_list.append(file)
+        files = [file for file in os.listdir(self.xml_folder) if file.endswith(".xml")]
+
+        def load():
+            with startup.phase("import (deferred)"):
+                from program_manager import add_files_to_cache
+            with startup.phase("parse"):
+                add_files_to_cache([os.path.join(self.xml_folder, file) for file in files], workers=PARSE_WORKERS)
+            return files
+
+        self.tasks.submit("load", load, on_done=self.on_files_loaded,
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to load XML files:\n{e}"),
+                          message=f"Loading {len(files)} XML file(s)...")
+        self.watcher.start()
+        self.root.after(WATCH_INTERVAL_MS, self.check_folder)
+
+    def check_folder(self):
+        """ Pick up XML files added, replaced or deleted in xml_files since the last check. """
+        changed, removed = self.watcher.poll()
+        if changed or removed:
+            self.syncs += 1
+
+            def sync():
+                from program_manager import sync_files
+                sync_files([os.path.join(self.xml_folder, file) for file in changed],
+                           [os.path.join(self.xml_folder, file) for file in removed], workers=PARSE_WORKERS)
+                return changed, removed
+
+            # Each sync gets its own channel: a later one must not cancel an earlier one.
+            self.tasks.submit(f"watch:{self.syncs}", sync, on_done=self.on_folder_synced,
+                              on_error=lambda e: print(f"Warning: could not reload changed XML files: {e}"),
+                              message=f"Reloading {len(changed) + len(removed)} changed XML file(s)...")
+        self.root.after(WATCH_INTERVAL_MS, self.check_folder)
+
+    def on_folder_synced(self, result):
+        changed, removed = result
+        self.file_list = [file for file in self.file_list if file not in removed]
+        if self.file_selector.get() in removed:
+            self.file_selector.set("All Files")
+        self.on_files_loaded(changed)
+
+    def on_files_loaded(self, files, select=None):
+        for file in files:
+            if file not in self.file_list:
+                self.file_list.append(file)
+        self.refresh_file_list()
+        if select:
+            self.file_selector.set(select)
+        self.request_update()
 
     def refresh_file_list(self):
         self.file_selector['values'] = ["All Files"] + self.file_list
@@ -122,68 +267,251 @@ class TransactionViewerApp:
         filename = os.path.basename(file_path)
         dest_path = os.path.join(self.xml_folder, filename)
 
-        shutil.copy(file_path, dest_path)
-        add_file_to_cache(dest_path)
+        def load():
+            from program_manager import replace_file_in_cache
+            shutil.copy(file_path, dest_path)
+            replace_file_in_cache(dest_path)
+            return [filename]
 
-        if filename not in self.file_list:
-            self.file_list.append(filename)
+        def on_done(files):
+            self.watcher.mark_seen(filename)
+            self.on_files_loaded(files, select=filename)
 
-        self.refresh_file_list()
-        self.file_selector.set(filename)
-        self.update_table()
+        self.tasks.submit(f"import:{filename}", load, on_done=on_done,
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to import {filename}:\n{e}"),
+                          message=f"Importing {filename}...")
+
+    def apply_date_range(self):
+        bounds = []
+        for entry in (self.date_from, self.date_to):
+            value = entry.get().strip()
+            try:
+                bounds.append(datetime.date.fromisoformat(value).isoformat() if value else None)
+            except ValueError:
+                messagebox.showerror("Invalid date", f"'{value}' is not a date like 2025-06-07.")
+                return
+        start_date, end_date = bounds
+        if start_date and end_date and start_date > end_date:
+            messagebox.showerror("Invalid range", "The From date is after the To date.")
+            return
+
+        files = [file for file in os.listdir(self.xml_folder) if file.endswith(".xml")]
+
+        def load():
+            from program_manager import set_ingest_filter, load_files
+            if set_ingest_filter(start_date, end_date):
+                load_files([os.path.join(self.xml_folder, file) for file in files], workers=PARSE_WORKERS)
+            return files
+
+        label = f"{start_date or 'start'} to {end_date or 'end'}" if start_date or end_date else "all dates"
+        self.tasks.submit("load", load, on_done=self.on_files_loaded,
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to load XML files:\n{e}"),
+                          message=f"Loading {label}...")
+
+    def clear_date_range(self):
+        self.date_from.delete(0, tk.END)
+        self.date_to.delete(0, tk.END)
+        self.apply_date_range()
+
+    def request_update(self):
+        """ Coalesce a burst of UI changes into a single update_table call. """
+        if self.pending_update is not None:
+            self.root.after_cancel(self.pending_update)
+        self.pending_update = self.root.after(UPDATE_DEBOUNCE_MS, self.update_table)
 
     def update_table(self):
+        self.pending_update = None
         if not self.file_list:
             return
 
+        # Read the widgets here; only plain values cross over to the worker thread.
         file_name = self.file_selector.get()
         sort_asc = self.sort_order.get() == "Oldest to Newest"
-        transactions = get_transactions(file_name)
         view_mode = self.view_option.get()
+        hide_transactions = self.show_totals_only.get()
+
+        def build():
+            with startup.phase("import (deferred)"):
+                import report_cache
+                from program_manager import get_aggregate
+            with startup.phase("aggregate"):
+                get_aggregate(file_name)
+            # Cached frames are shared, never copied: nothing downstream modifies them.
+            with startup.phase("report"):
+                return report_cache.get_report(file_name, view_mode, ascending=sort_asc, totals_only=hide_transactions)
+
+        # Submitting on the "report" channel drops any older report still in flight.
+        self.tasks.submit("report", build, on_done=self.show_report,
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to build report:\n{e}"),
+                          message="Building report...")
+
+    def show_report(self, df):
+        self.dataframe = df
+        with startup.phase("first render"):
+            self.update_sheet_from_dataframe()
+        if not startup.finished:
+            self.finish_startup_timing()
+
+    def finish_startup_timing(self):
+        startup.finish()
+        total = startup.marks["first report"]
+        self.status_text.set(f"Ready (first report in {total:.2f} s)")
+        if SHOW_STARTUP_TIMING:
+            print(startup.format())
+            try:
+                startup.write(os.path.join(self.base_path, "startup_timing.json"))
+            except OSError as e:
+                print(f"Warning: could not write startup timing: {e}")
 
-        report_dispatch = {
-            "With EBT food": lambda: ebt_summary_report(transactions, ascending=sort_asc),
-            "Daily Totals": lambda: group_by_date_totals_only(transactions, ascending=sort_asc),
-            "Group by Date": lambda: group_by_date_with_summary(transactions, ascending=sort_asc, hide_transactions=self.show_totals_only.get())
-        }
+    @instrumentation.timed("render", rows=lambda result, self, *a, **k: len(self.dataframe))
+    def update_sheet_from_dataframe(self):
+        self.feed = SheetDataFeed(self.dataframe)
+        self.window_start = 0
 
-        df = report_dispatch.get(view_mode, lambda: pd.DataFrame())()
-        self.dataframe = df.copy()
-        self.update_sheet_from_dataframe()
+        if self.is_virtual():
+            self.sheet.hide("y_scrollbar")
+            self.v_scroll.grid(row=0, column=1, sticky="ns")
+            self.show_window(0, reset=True)
+        else:
+            self.v_scroll.grid_remove()
+            self.sheet.show("y_scrollbar")
+            self.sheet.set_index_data([], redraw=False)
+            self.sheet.set_sheet_data(self.feed.rows(0, len(self.feed)), reset_col_positions=True, reset_row_positions=True)
+
+        self.sheet.headers(self.feed.headers)
+        self.sheet.total_columns(len(self.dataframe.columns))
+        self.sheet.set_column_widths(self.feed.column_widths(char_width=self.char_width()))
+        self.sheet.refresh()
 
-    def update_sheet_from_dataframe(self):
-        self.sheet.set_sheet_data(self.dataframe.values.tolist(), reset_col_positions=True, reset_row_positions=True)
-        self.sheet.headers(self.dataframe.columns.tolist())
-        self.sheet.total_columns(len(self.dataframe.columns))  
-        self.sheet.set_all_column_widths()
+    def is_virtual(self):
+        return self.feed is not None and len(self.feed) > VIRTUAL_ROW_THRESHOLD
+
+    def visible_rows(self):
+        return max(1, self.sheet_frame.winfo_height() // ROW_HEIGHT - 2)
+
+    def show_window(self, start, reset=False):
+        """ Put rows [start, start + visible rows) of the report into the sheet. """
+        if not self.is_virtual():
+            return
+        window = self.visible_rows()
+        total = len(self.feed)
+        start = max(0, min(int(start), total - window))
+        if start == self.window_start and not reset:
+            return
+        # An open cell editor belongs to the rows about to scroll away: commit it first.
+        self.sheet.close_text_editor(set_data=True)
+        self.window_start = start
+        rows = self.feed.rows(start, start + window)
+        self.sheet.set_sheet_data(rows, reset_col_positions=False, reset_row_positions=True, redraw=False)
+        self.sheet.set_index_data([str(row) for row in range(start + 1, start + len(rows) + 1)], redraw=False)
+        self.v_scroll.set(start / total, min(1.0, (start + window) / total))
         self.sheet.refresh()
 
+    def on_virtual_scroll(self, action, amount, unit=None):
+        window = self.visible_rows()
+        if action == "moveto":
+            self.show_window(float(amount) * len(self.feed))
+        elif action == "scroll":
+            step = window if unit == "pages" else 1
+            self.show_window(self.window_start + int(amount) * step)
+
+    def on_virtual_wheel(self, event):
+        if not self.is_virtual():
+            return None  # let the sheet scroll itself
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.show_window(self.window_start - 3)
+        else:
+            self.show_window(self.window_start + 3)
+        return "break"
+
+    def on_virtual_key(self, event):
+        """ Move the window when the cursor would step off its first or last row. """
+        selected = self.sheet.get_currently_selected()
+        if not self.is_virtual() or not selected:
+            return None
+        window = self.visible_rows()
+        step = {"Up": -1, "Down": 1, "Prior": -window, "Next": window}[event.keysym]
+        row = selected.row + step
+        if 0 <= row < min(window, len(self.feed) - self.window_start):
+            return None  # still inside the window: let the sheet move the cursor
+        start = self.window_start
+        self.show_window(start + step)
+        row = max(0, min(row - (self.window_start - start), self.sheet.get_total_rows() - 1))
+        self.sheet.select_cell(row, selected.column)
+        return "break"
+
+    def on_sheet_modified(self, event):
+        """ Keep edited cells in the feed and queue the Group by Date amounts for edit_db. """
+        if self.feed is None:
+            return
+        offset = self.window_start if self.is_virtual() else 0
+        file_name = self.file_selector.get()
+        for r, c in event["cells"]["table"]:
+            value = self.sheet.get_cell_data(r, c)
+            self.feed.set_cell(offset + r, c, value)
+            target = self.edit_target(offset + r, c)
+            if target is not None and file_name != "All Files":
+                self.unsaved_edits.append((file_name, *target, None if value in (None, "") else str(value)))
+        if self.unsaved_edits:
+            # A newer submit cancels a queued save, but whichever runs saves everything queued.
+            self.tasks.submit("edits", self.save_edits, message="Saving edits...")
+
+    def edit_target(self, row, column):
+        """ (date, card type, field) of a Group by Date amount cell, or None if the cell is not a saved edit. """
+        df = self.dataframe
+        if column >= len(df.columns) or df.columns[column] not in EDITABLE_COLUMNS or \
+                "Date" not in df.columns or "Card Type" not in df.columns:
+            return None
+        card_type = df["Card Type"].iat[row]
+        dates = df["Date"].iloc[:row + 1]
+        dates = dates[dates != ""]  # repeated dates are blanked below the first row of each day
+        if not card_type or dates.empty:
+            return None
+        return dates.iat[-1], card_type, df.columns[column].lower()
+
+    def save_edits(self):
+        import edit_db
+        with edit_db.batch_edits():
+            while self.unsaved_edits:
+                file_name, date, card_type, field, value = self.unsaved_edits.popleft()
+                if value is None:
+                    edit_db.delete_edit(file_name, date, card_type, field)
+                else:
+                    edit_db.save_edit(file_name, date, card_type, field, value)
 
     def export_pdf(self):
-        if self.dataframe.empty:
+        if self.dataframe is None or self.dataframe.empty:
             messagebox.showwarning("No Data", "No data to export.")
             return
         file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF Files", "*.pdf")])
         if file_path:
-            try:
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                export_to_pdf(self.dataframe, file_path)
-                messagebox.showinfo("Success", f"PDF saved: {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save PDF:\n{e}")
+            def exporter(df, path):
+                from pdf_exporter import export_to_pdf
+                export_to_pdf(df, path)
+            self.run_export(exporter, file_path, "PDF")
 
     def export_excel(self):
-        if self.dataframe.empty:
+        if self.dataframe is None or self.dataframe.empty:
             messagebox.showwarning("No Data", "No data to export.")
             return
         file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel Files", "*.xlsx")])
         if file_path:
-            try:
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                export_to_excel(self.dataframe, file_path)
-                messagebox.showinfo("Success", f"Excel saved: {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save Excel:\n{e}")
+            def exporter(df, path):
+                from excel_exporter import export_to_excel
+                export_to_excel(df, path)
+            self.run_export(exporter, file_path, "Excel")
+
+    def run_export(self, exporter, file_path, label):
+        df = self.dataframe
+
+        def export():
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            exporter(df, file_path)
+
+        self.tasks.submit(f"export:{file_path}", export,
+                          on_done=lambda _: messagebox.showinfo("Success", f"{label} saved: {file_path}"),
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to save {label}:\n{e}"),
+                          message=f"Exporting {label}...")
 
     def on_view_option_change(self, event=None):
         selected = self.view_option.get()
@@ -192,9 +520,11 @@ class TransactionViewerApp:
         else:
             self.totals_only_checkbox.state(["disabled"])
             self.show_totals_only.set(False)
-        self.update_table()
+        self.request_update()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = TransactionViewerApp(root)
+    startup.mark("app created")
     root.mainloop()
\ No newline at end of file
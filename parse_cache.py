@@ -0,0 +1,314 @@
+# parse_cache.py
+import collections
+import hashlib
+import marshal
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from transaction_table import TransactionTable
+from report_engine import DailyAggregate, MEASURES
+import instrumentation
+import xml_parser
+
+CACHE_DB = "parse_cache.db"
+SCHEMA_VERSION = 3
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        _conn.execute('''
+            CREATE TABLE IF NOT EXISTS parsed_files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER,
+                sha1 TEXT,
+                schema INTEGER,
+                payload BLOB
+            )
+        ''')
+        # First/last BatchDate per file, so date-filtered loads can skip files unopened.
+        _conn.execute('''
+            CREATE TABLE IF NOT EXISTS file_dates (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER,
+                first_date TEXT,
+                last_date TEXT
+            )
+        ''')
+        # Each file's (date, card type) totals, so a cached file is not re-aggregated either.
+        _conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_totals (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER,
+                schema INTEGER,
+                payload BLOB
+            )
+        ''')
+        _conn.commit()
+    return _conn
+
+
+def close_cache():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def file_digest(file_path):
+    """ SHA-1 of the file contents, read in 1 MB chunks. """
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(table):
+    # Categoricals go in as (categories, int32 codes); numeric columns as raw array bytes.
+    columns = (
+        list(table.batch_date.categories),
+        table.batch_date.codes.astype(np.int32).tobytes(),
+        list(table.card_type.categories),
+        table.card_type.codes.astype(np.int32).tobytes(),
+        table.quantity.tobytes(),
+        table.gross.tobytes(),
+        table.net.tobytes(),
+        table.fee.tobytes(),
+    )
+    return marshal.dumps(columns)
+
+
+def _decode(payload):
+    dates, date_codes, card_types, card_codes, quantity, gross, net, fee = marshal.loads(payload)
+    return TransactionTable(
+        pd.Categorical.from_codes(np.frombuffer(date_codes, dtype=np.int32), categories=dates),
+        pd.Categorical.from_codes(np.frombuffer(card_codes, dtype=np.int32), categories=card_types),
+        np.frombuffer(quantity, dtype=np.int64),
+        np.frombuffer(gross, dtype=np.int64),
+        np.frombuffer(net, dtype=np.int64),
+        np.frombuffer(fee, dtype=np.int64),
+    )
+
+
+def _lookup(abs_path, stat):
+    """ Return the cached transactions for an unchanged file, or None. """
+    with _lock:
+        row = _connection().execute(
+            "SELECT mtime_ns, size, sha1, schema, payload FROM parsed_files WHERE path = ?",
+            (abs_path,)
+        ).fetchone()
+
+    if not row or row[3] != SCHEMA_VERSION or row[1] != stat.st_size:
+        instrumentation.count("parse_cache.miss")
+        return None
+
+    mtime_ns, _, sha1, _, payload = row
+    if mtime_ns != stat.st_mtime_ns:
+        # Touched but possibly unchanged: trust the content hash.
+        if sha1 != file_digest(abs_path):
+            instrumentation.count("parse_cache.miss")
+            return None
+        with _lock:
+            conn = _connection()
+            conn.execute("UPDATE parsed_files SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, abs_path))
+            conn.commit()
+
+    instrumentation.count("parse_cache.hit")
+    return _decode(payload)
+
+
+def _stored_date_index(abs_paths):
+    """ {path: date index entry} stored for those of these files xml_parser.date_index does not know yet. """
+    spans = {}
+    with _lock:
+        conn = _connection()
+        for path in abs_paths:
+            row = conn.execute("SELECT mtime_ns, size, first_date, last_date FROM file_dates WHERE path = ?",
+                               (path,)).fetchone()
+            if row and path not in xml_parser.date_index:
+                spans[path] = tuple(row)
+    return spans
+
+
+def _save_date_index(entries):
+    rows = [(path,) + entry for path, entry in entries.items() if entry is not None]
+    if not rows:
+        return
+    with _lock:
+        conn = _connection()
+        conn.executemany('''
+            INSERT OR REPLACE INTO file_dates (path, mtime_ns, size, first_date, last_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+
+def load_transactions(file_path):
+    """ Return parsed transactions for a file, re-parsing only if it changed since it was cached. """
+    return load_many([file_path])[0]
+
+
+def load_many(file_paths, workers=None, start_date=None, end_date=None, card_types=None):
+    """ Like load_transactions for several files; changed files are parsed with parse_files.
+
+    With a date range or card_types only matching rows are returned. Files whose
+    stored date span misses the range are skipped without being read; cached
+    files are filtered in memory; the rest get a filtered parse, which is not
+    stored since it does not hold the whole file.
+    """
+    tables, reads = fetch_many(file_paths, workers, start_date, end_date, card_types)
+    xml_parser.apply_reads(reads)
+    return tables
+
+
+def fetch_many(file_paths, workers=None, start_date=None, end_date=None, card_types=None):
+    """ load_many without changing xml_parser's in-memory state: (tables in order, reads for apply_reads).
+
+    Only the cache database is written, so this can run on a thread of its own.
+    """
+    abs_paths = [os.path.abspath(p) for p in file_paths]
+    filtered = start_date is not None or end_date is not None or card_types is not None
+    results = {}
+    stats = {}
+    reads = {}
+    saved = {}
+
+    spans = _stored_date_index(dict.fromkeys(abs_paths)) if filtered else {}
+    index = collections.ChainMap(xml_parser.date_index, spans)
+    reads.update((path, (None, None, entry)) for path, entry in spans.items())
+    for path in dict.fromkeys(abs_paths):
+        if not os.path.exists(path):
+            continue
+        stat = stats[path] = os.stat(path)
+        if filtered and not xml_parser.file_may_match(path, start_date, end_date, index):
+            instrumentation.count("parse_cache.skipped")
+            results[path] = TransactionTable.empty()
+            continue
+        transactions = _lookup(path, stat)
+        if transactions is not None:
+            results[path] = transactions.filter(start_date, end_date, card_types)
+            stale = index.get(path, ())[:2] != (stat.st_mtime_ns, stat.st_size)
+            reads[path] = (transactions, True,
+                           xml_parser.date_entry(stat, transactions.date_span()) if stale else spans.get(path))
+
+    misses = [p for p in stats if p not in results]
+    parsed, parsed_reads = xml_parser.read_files(misses, workers=workers, start_date=start_date, end_date=end_date,
+                                                 card_types=card_types, reread=True)
+    for path, transactions in zip(misses, parsed):
+        _, ok, entry = parsed_reads[path]
+        # A parse that stopped at an error is returned for this run only, never stored as the file's contents.
+        if not filtered and ok:
+            _store_row(path, transactions, stats[path])
+            entry = saved[path] = xml_parser.date_entry(stats[path], transactions.date_span())
+        reads[path] = parsed_reads[path][:2] + (entry or spans.get(path),)
+        results[path] = transactions
+    if filtered:
+        saved = {path: reads[path][2] if path in reads and reads[path][2] else index.get(path) for path in stats}
+    _save_date_index(saved)
+
+    # Missing files get read_files' usual warning.
+    missing = [p for p in dict.fromkeys(abs_paths) if p not in results]
+    tables, missing_reads = xml_parser.read_files(missing, reread=True)
+    results.update(zip(missing, tables))
+    reads.update(missing_reads)
+    return [results[p] for p in abs_paths], reads
+
+
+def store_transactions(file_path, transactions, stat=None):
+    abs_path = os.path.abspath(file_path)
+    stat = stat or os.stat(abs_path)
+    _store_row(abs_path, transactions, stat)
+    xml_parser.record_date_span(abs_path, stat, transactions.date_span())
+    _save_date_index({abs_path: xml_parser.date_index.get(abs_path)})
+
+
+def _store_row(abs_path, transactions, stat):
+    with _lock:
+        conn = _connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO parsed_files (path, mtime_ns, size, sha1, schema, payload)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (abs_path, stat.st_mtime_ns, stat.st_size, file_digest(abs_path),
+              SCHEMA_VERSION, _encode(transactions)))
+        conn.commit()
+
+
+def _encode_aggregate(aggregate):
+    frame = aggregate.frame
+    return marshal.dumps((frame["Date"].tolist(), frame["Card Type"].tolist())
+                         + tuple(frame[col].to_numpy(dtype=np.int64).tobytes() for col in MEASURES))
+
+
+def _decode_aggregate(payload):
+    dates, card_types, *measures = marshal.loads(payload)
+    frame = pd.DataFrame({"Date": pd.Series(dates, dtype=str), "Card Type": pd.Series(card_types, dtype=str)})
+    for col, values in zip(MEASURES, measures):
+        frame[col] = np.frombuffer(values, dtype=np.int64)
+    return DailyAggregate(frame)
+
+
+def load_aggregate(file_path):
+    """ The stored daily aggregate of a file that has not changed since it was stored, or None. """
+    abs_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        return None
+    with _lock:
+        row = _connection().execute(
+            "SELECT payload FROM daily_totals WHERE path = ? AND mtime_ns = ? AND size = ? AND schema = ?",
+            (abs_path, stat.st_mtime_ns, stat.st_size, SCHEMA_VERSION)
+        ).fetchone()
+    instrumentation.count("parse_cache.aggregate_hit" if row else "parse_cache.aggregate_miss")
+    return _decode_aggregate(row[0]) if row else None
+
+
+def store_aggregate(file_path, aggregate):
+    """ Store a file's daily aggregate next to its cached parse; skipped if the file changed since that parse. """
+    abs_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        return
+    with _lock:
+        conn = _connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO daily_totals (path, mtime_ns, size, schema, payload)
+            SELECT path, mtime_ns, size, schema, ? FROM parsed_files
+            WHERE path = ? AND mtime_ns = ? AND size = ? AND schema = ?
+        ''', (_encode_aggregate(aggregate), abs_path, stat.st_mtime_ns, stat.st_size, SCHEMA_VERSION))
+        conn.commit()
+
+
+def forget_file(file_path):
+    """ Drop the cached parse of a file, e.g. after it was deleted. """
+    abs_path = os.path.abspath(file_path)
+    with _lock:
+        conn = _connection()
+        conn.execute("DELETE FROM parsed_files WHERE path = ?", (abs_path,))
+        conn.execute("DELETE FROM file_dates WHERE path = ?", (abs_path,))
+        conn.execute("DELETE FROM daily_totals WHERE path = ?", (abs_path,))
+        conn.commit()
+    xml_parser.date_index.pop(abs_path, None)
+
+
+def clear_parse_cache():
+    with _lock:
+        conn = _connection()
+        conn.execute("DELETE FROM parsed_files")
+        conn.execute("DELETE FROM file_dates")
+        conn.execute("DELETE FROM daily_totals")
+        conn.commit()
+    xml_parser.date_index.clear()
+    print("Parse cache cleared.")
@@ -2,29 +2,105 @@
 
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+import os
+import numpy as np
 import pandas as pd
+from instrumentation import timed
 
-def export_to_pdf(df: pd.DataFrame, file_path: str):
+# SimpleDocTemplate's frame pads its content by this much on every side.
+FRAME_PADDING = 6
 
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.gray),  # header background
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),  # header font color
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),  # header font
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+])
+
+def _format_columns(df: pd.DataFrame):
+    """ Format every column to strings once, column by column, instead of cell by cell. """
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_float_dtype(values):
+            columns.append(np.char.mod("%.2f", values.to_numpy()).tolist())
+        else:
+            columns.append(values.astype(str).tolist())
+    return [list(row) for row in zip(*columns)]
+
+def _table(header, rows):
+    table = Table([header] + rows, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+def _height(flowables, width, room):
+    return sum(f.wrap(width, room)[1] + f.getSpaceBefore() + f.getSpaceAfter() for f in flowables)
+
+def _paged_tables(df: pd.DataFrame, width, room, used=0.0):
+    """ Split df into Tables that each fill the rest of a page, with a PageBreak after each.
+
+    Row and header heights are measured from a sample table, so every page
+    starts with exactly one header. Returns (flowables, height used on the
+    last page) so the caller can keep laying out below the last table.
+    """
+    if df.empty:
+        return [], used
+    header = [str(col) for col in df.columns]
+    header_height = _table(header, []).wrap(width, room)[1]
+    row_height = _table(header, _format_columns(df.iloc[:1])).wrap(width, room)[1] - header_height
+    flowables = []
+    start = 0
+    while start < len(df):
+        fits = int((room - used - header_height) // row_height)
+        if fits < 1 and used:
+            flowables.append(PageBreak())
+            used = 0.0
+            continue
+        rows = _format_columns(df.iloc[start:start + max(fits, 1)])
+        flowables.append(_table(header, rows))
+        start += len(rows)
+        used += header_height + len(rows) * row_height
+        if start < len(df):
+            flowables.append(PageBreak())
+            used = 0.0
+    return flowables, used
+
+@timed("export.pdf", rows=lambda result, df, *a, **k: len(df),
+       nbytes=lambda result, df, file_path, *a, **k: os.path.getsize(file_path))
+def export_to_pdf(df: pd.DataFrame, file_path: str, summary_first: bool = False,
+                  daily_totals: pd.DataFrame = None):
+    """ Export a report as a series of page-sized tables.
+
+    With summary_first, the GRAND TOTAL row (and daily_totals, when given)
+    come first, followed by the detail rows on a new page.
+    """
     if df.empty:
         raise ValueError("DataFrame is empty. Nothing to export.")
 
     doc = SimpleDocTemplate(file_path, pagesize=letter)
-    data = [list(df.columns)] + df.values.tolist()  # header + rows
-
-    table = Table(data, repeatRows=1)
+    room = doc.height - 2 * FRAME_PADDING
+    elements = []
 
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.gray),  # header background
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),  # header font color
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),  # header font
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-    ])
+    if summary_first and "Date" in df.columns:
+        is_total = df["Date"] == "GRAND TOTAL"
+        styles = getSampleStyleSheet()
+        elements.append(Paragraph("Summary", styles["Heading2"]))
+        tables, used = _paged_tables(df[is_total], doc.width, room, _height(elements, doc.width, room))
+        elements.extend(tables)
+        if daily_totals is not None and not daily_totals.empty:
+            heading = [Spacer(1, 12), Paragraph("Daily Totals", styles["Heading2"])]
+            elements.extend(heading)
+            tables, used = _paged_tables(daily_totals[daily_totals["Date"] != "GRAND TOTAL"], doc.width, room,
+                                         used + _height(heading, doc.width, room))
+            elements.extend(tables)
+        df = df[~is_total]
+        if not df.empty:
+            elements.append(PageBreak())
 
-    table.setStyle(style)
-    elements = [table]
+    elements.extend(_paged_tables(df, doc.width, room)[0])
 
     doc.build(elements)
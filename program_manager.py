@@ -1,27 +1,228 @@
 # program_manager.py
-from xml_parser import parse_single_file
-from card_transaction import CardTransaction
+from xml_parser import parse_files, parse_single_file, read_files
+from parse_cache import load_many, fetch_many, forget_file, load_aggregate, store_aggregate
+from transaction_table import TransactionTable
+from report_engine import DailyAggregate
+import edit_overlay
+import xml_parser
 import os
 
 transaction_cache = {}
+# Per-file partial aggregates, merged into all_files_aggregate as files come and go. Together they are
+# the date x card type x file cube every view is rolled up from; cached files keep theirs in parse_cache.
+aggregate_cache = {}
+# The same partials with the file's saved edits applied; dropped when those edits change.
+edited_cache = {}
+all_files_aggregate = None
+file_paths = {}
+# Bumped whenever the set of loaded transactions changes; part of every report cache key.
+data_version = 0
+# Date range / card types every load keeps; files and batches outside it are skipped while parsing.
+ingest_filter = {"start_date": None, "end_date": None, "card_types": None}
 
-def load_files(xml_files):
-    """ Load multiple XML files into the transaction cache. """
+def set_ingest_filter(start_date=None, end_date=None, card_types=None):
+    """ Restrict later loads to a date range and/or card types; returns True if the filter changed.
+
+    Files already loaded keep their rows until they are loaded again.
+    """
+    new = {"start_date": start_date or None, "end_date": end_date or None,
+           "card_types": frozenset(card_types) if card_types else None}
+    global data_version
+    changed = new != ingest_filter
+    ingest_filter.update(new)
+    if changed:
+        data_version += 1
+    return changed
+
+def _parse(path, use_disk_cache):
+    if use_disk_cache:
+        return load_many([path], **ingest_filter)[0]
+    return parse_single_file(path, **ingest_filter)
+
+def _parse_many(paths, use_disk_cache, workers):
+    if use_disk_cache:
+        return load_many(paths, workers=workers, **ingest_filter)
+    return parse_files(paths, workers=workers, **ingest_filter)
+
+def _resolve(xml_file):
+    return os.path.join(os.path.dirname(__file__), xml_file) if not os.path.isabs(xml_file) else xml_file
+
+def _aggregate(abs_path, transactions, use_disk_cache, ok=None):
+    # A filtered or failed load only holds part of the file, so its totals are neither reused nor stored.
+    if ok is None:
+        ok = os.path.abspath(abs_path) not in xml_parser.failed
+    if not use_disk_cache or any(value is not None for value in ingest_filter.values()) or not ok:
+        return DailyAggregate.from_table(transactions)
+    aggregate = load_aggregate(abs_path)
+    if aggregate is None:
+        aggregate = DailyAggregate.from_table(transactions)
+        store_aggregate(abs_path, aggregate)
+    return aggregate
+
+def _store(filename, abs_path, transactions, use_disk_cache=False, aggregate=None):
+    """ Cache a file's transactions and fold its partial aggregate into the "All Files" total. """
+    global all_files_aggregate, data_version
+    data_version += 1
+    transaction_cache[filename] = transactions
+    aggregate_cache[filename] = aggregate if aggregate is not None else _aggregate(abs_path, transactions, use_disk_cache)
+    edited_cache.pop(filename, None)
+    file_paths[filename] = os.path.abspath(abs_path)
+    if all_files_aggregate is not None:
+        all_files_aggregate = DailyAggregate.merge([all_files_aggregate, _edited_aggregate(filename)])
+
+def _edited_aggregate(filename):
+    if filename not in edited_cache:
+        edited_cache[filename] = edit_overlay.apply(aggregate_cache[filename], filename)
+    return edited_cache[filename]
+
+def _on_edits_changed(filenames):
+    global all_files_aggregate
+    if filenames is None:
+        edited_cache.clear()
+    else:
+        for filename in filenames:
+            edited_cache.pop(filename, None)
+    all_files_aggregate = None
+
+edit_overlay.add_listener(_on_edits_changed)
+
+def _clear():
+    global all_files_aggregate, data_version
+    data_version += 1
     transaction_cache.clear()
-    for path in xml_files:
-        filename = os.path.basename(path)
-        transactions = parse_single_file(path)
-        transaction_cache[filename] = transactions
-def add_file_to_cache(xml_file):
-    abs_path = os.path.join(os.path.dirname(__file__), xml_file) if not os.path.isabs(xml_file) else xml_file
+    aggregate_cache.clear()
+    edited_cache.clear()
+    file_paths.clear()
+    all_files_aggregate = None
+
+def load_files(xml_files, use_disk_cache=True, workers=None):
+    """ Load multiple XML files into the transaction cache. Pass workers > 1 to parse them in parallel. """
+    publish(parse_paths(xml_files, use_disk_cache, workers), replace=True, use_disk_cache=use_disk_cache)
+
+def parse_paths(xml_files, use_disk_cache=True, workers=None, reread=False):
+    """ Parse and aggregate files without touching any module state: {abs path: (transactions, aggregate, read)}.
+
+    This is the slow half of a load. It may run on another thread while
+    reports are served from what is loaded; publish() then files the parser
+    state in read and swaps the tables in. With reread, in-memory parses of
+    these files are ignored.
+    """
+    paths = list(dict.fromkeys(os.path.abspath(p) for p in xml_files))
+    if use_disk_cache:
+        tables, reads = fetch_many(paths, workers=workers, **ingest_filter)
+    else:
+        tables, reads = read_files(paths, workers=workers, reread=reread, **ingest_filter)
+    parsed = {}
+    for path, transactions in zip(paths, tables):
+        read = reads.get(path)
+        ok = None if read is None else read[1]
+        parsed[path] = (transactions, _aggregate(path, transactions, use_disk_cache, ok), read)
+    return parsed
+
+def publish(parsed, removed=(), replace=False, use_disk_cache=True):
+    """ Swap files parsed by parse_paths into the loaded set and drop the removed paths.
+
+    With replace, the loaded set becomes exactly the parsed files.
+    """
+    removed = [os.path.abspath(_resolve(p)) for p in removed]
+    if replace:
+        _clear()
+    else:
+        remove_files_from_cache([os.path.basename(p) for p in removed + list(parsed)])
+    for path in removed:
+        if use_disk_cache:
+            forget_file(path)
+        else:
+            xml_parser.date_index.pop(path, None)
+    xml_parser.apply_reads({path: read for path, (_, _, read) in parsed.items() if read is not None})
+    for path, (transactions, aggregate, _) in parsed.items():
+        _store(os.path.basename(path), path, transactions, aggregate=aggregate)
+
+def load_archive(root="archive"):
+    """ Load the files stored in a transaction archive instead of parsing XML; ingest_filter still applies. """
+    import transaction_archive  # pulls in pyarrow, so only when an archive is used
+    _clear()
+    for filename, transactions in transaction_archive.read_archive(root, **ingest_filter).items():
+        _store(filename, os.path.join(root, filename), transactions)
+
+def archive_files(root="archive", fmt="feather"):
+    """ Write every loaded file's transactions to a transaction archive; returns the paths written. """
+    import transaction_archive
+    if any(value is not None for value in ingest_filter.values()):
+        # The loaded tables only hold part of each file and would replace its full archive.
+        raise ValueError("Cannot archive while a date range or card type filter is applied.")
+    return transaction_archive.write_archive(transaction_cache, root, fmt)
+
+def add_file_to_cache(xml_file, use_disk_cache=True):
+    abs_path = _resolve(xml_file)
     filename = os.path.basename(abs_path)
     if filename not in transaction_cache:
-        transaction_cache[filename] = parse_single_file(abs_path)
+        _store(filename, abs_path, _parse(abs_path, use_disk_cache), use_disk_cache)
+
+def add_files_to_cache(xml_files, use_disk_cache=True, workers=None):
+    """ add_file_to_cache for a batch of files, parsing the new ones in parallel when workers > 1. """
+    new_paths = {}
+    for xml_file in xml_files:
+        abs_path = _resolve(xml_file)
+        filename = os.path.basename(abs_path)
+        if filename not in transaction_cache and filename not in new_paths:
+            new_paths[filename] = abs_path
+
+    paths = list(new_paths.values())
+    for (filename, abs_path), transactions in zip(new_paths.items(), _parse_many(paths, use_disk_cache, workers)):
+        _store(filename, abs_path, transactions, use_disk_cache)
+
+def remove_file_from_cache(file_name):
+    """ Drop one file; the "All Files" total is re-summed from the remaining partials only. """
+    remove_files_from_cache([file_name])
+
+def remove_files_from_cache(file_names):
+    """ Drop several files, re-summing the "All Files" total once for all of them. """
+    global all_files_aggregate, data_version
+    dropped = [f for f in dict.fromkeys(file_names) if f in transaction_cache]
+    if not dropped:
+        return
+    data_version += 1
+    for file_name in dropped:
+        del transaction_cache[file_name]
+        aggregate_cache.pop(file_name, None)
+        edited_cache.pop(file_name, None)
+        xml_parser.cache.pop(file_paths.pop(file_name, None), None)
+    if all_files_aggregate is not None:
+        all_files_aggregate = DailyAggregate.merge(_edited_aggregate(f) for f in aggregate_cache)
+
+def sync_files(changed, removed=(), use_disk_cache=True, workers=None):
+    """ Catch up with a folder change: forget removed files, reload changed ones, add new ones.
+
+    Only changed and removed files cost a re-sum of the "All Files" total; new
+    files are folded into it one partial at a time.
+    """
+    changed = [_resolve(p) for p in changed]
+    publish(parse_paths(changed, use_disk_cache, workers, reread=True), removed, use_disk_cache=use_disk_cache)
+
+def replace_file_in_cache(xml_file, use_disk_cache=True):
+    """ (Re)load one file after it was added or changed on disk, leaving every other file untouched. """
+    abs_path = _resolve(xml_file)
+    filename = os.path.basename(abs_path)
+    remove_file_from_cache(filename)
+    xml_parser.cache.pop(os.path.abspath(abs_path), None)
+    add_file_to_cache(abs_path, use_disk_cache=use_disk_cache)
+
+def get_transactions(file_name, start_date=None, end_date=None, card_types=None):
+    """ Loaded transactions of a file or "All Files", optionally narrowed to a date range / card types. """
+    if file_name == "All Files":
+        transactions = TransactionTable.concat(transaction_cache.values())
+    else:
+        transactions = transaction_cache.get(file_name) or TransactionTable.empty()
+    return transactions.filter(start_date, end_date, card_types)
 
-def get_transactions(file_name):
+def get_aggregate(file_name):
+    """ Daily-by-card-type aggregate for a file or "All Files", with saved edits applied. """
+    global all_files_aggregate
     if file_name == "All Files":
-        all_tx = []
-        for tx_list in transaction_cache.values():
-            all_tx.extend(tx_list)
-        return all_tx
-    return transaction_cache.get(file_name, [])
+        if all_files_aggregate is None:
+            all_files_aggregate = DailyAggregate.merge(_edited_aggregate(f) for f in aggregate_cache)
+        return all_files_aggregate
+    if file_name not in aggregate_cache:
+        return DailyAggregate.from_table(get_transactions(file_name))
+    return _edited_aggregate(file_name)
@@ -1,126 +1,102 @@
 # core/report_analyzer.py
 import pandas as pd
-from card_transaction import CardTransaction
+from report_engine import DailyAggregate, MEASURES
+from transaction_table import CENTS
+from instrumentation import timed
 
+# Amounts stay in integer cents through every sum and are turned into dollars once, on the finished report.
+MONEY = ["EBT Food Stamp", "Gross", "Net", "Fee"]
+
+
+def daily_aggregate(transactions):
+    """ Accept a DailyAggregate as-is, otherwise aggregate the transactions once. """
+    if isinstance(transactions, DailyAggregate):
+        return transactions
+    return DailyAggregate.from_table(transactions)
+
+
+def _sorted(df, ascending):
+    # Stable, so card types keep their order inside each date either way.
+    return df.sort_values(by="Date", ascending=ascending, kind="stable")
+
+
+def _grand_row(body, label_columns):
+    # Exact integer sums of the body, so the total always matches the rows above it to the cent.
+    grand = body.drop(columns=label_columns).sum()
+    row = {col: "" for col in label_columns}
+    row["Date"] = "GRAND TOTAL"
+    for col, value in grand.items():
+        row[col] = int(value)
+    return pd.DataFrame([row], columns=body.columns)
+
+
+def _dollars(report):
+    for col in MONEY:
+        if col in report.columns:
+            report[col] = report[col] / CENTS
+    return report
+
+
+@timed("report.ebt_summary", rows=lambda result, *a, **k: len(result))
 def ebt_summary_report(transactions, ascending=True):
     if not transactions:
         return pd.DataFrame(columns=["Date", "EBT Food Stamp", "Gross", "Fee", "Net"])
 
-    ebt_rows = []
-    all_rows = []
-
-    for t in transactions:
-        row = {
-            "Date": t.batch_date,
-            "Gross": t.gross,
-            "Fee": t.fee,
-            "Net": t.net
-        }
-        all_rows.append(row)
-
-        if t.card_type.strip().upper() == "EBT FOOD STAMP":
-            ebt_rows.append({
-                "Date": t.batch_date,
-                "EBT Food Stamp": t.net
-            })
-
-    df_all = pd.DataFrame(all_rows)
-    df_ebt = pd.DataFrame(ebt_rows)
-
-    # Summarize totals
-    total_all = df_all.groupby("Date", as_index=False).sum(numeric_only=True)
-    total_ebt = df_ebt.groupby("Date", as_index=False).sum(numeric_only=True)
-
-    # Merge both
-    merged = pd.merge(total_all, total_ebt, on="Date", how="left")
-    merged["EBT Food Stamp"] = merged["EBT Food Stamp"].fillna(0)
-
-    # Round
-    merged["EBT Food Stamp"] = merged["EBT Food Stamp"].round(2)
-    merged["Gross"] = merged["Gross"].round(2)
-    merged["Fee"] = merged["Fee"].round(2)
-    merged["Net"] = merged["Net"].round(2)
-
-    # Sort
-    merged = merged.sort_values(by="Date", ascending=ascending)
-
-    grand = merged[["EBT Food Stamp", "Gross", "Fee", "Net"]].sum()
-    grand_row = pd.DataFrame([{
-        "Date": "GRAND TOTAL",
-        "EBT Food Stamp": round(grand["EBT Food Stamp"], 2),
-        "Gross": round(grand["Gross"], 2),
-        "Fee": round(grand["Fee"], 2),
-        "Net": round(grand["Net"], 2)
-    }])
-    merged = merged[["Date", "EBT Food Stamp", "Gross", "Fee", "Net"]]
-
-    return pd.concat([merged, grand_row], ignore_index=True)
+    daily = daily_aggregate(transactions).by_date()
+    merged = _sorted(daily[["Date", "EBT Food Stamp", "Gross", "Fee", "Net"]], ascending)
+
+    return _dollars(pd.concat([merged, _grand_row(merged, ["Date"])], ignore_index=True))
 
 
+@timed("report.group_by_date", rows=lambda result, *a, **k: len(result))
 def group_by_date_with_summary(transactions, ascending=True, hide_transactions=False):
     if not transactions:
         return pd.DataFrame(columns=["Date", "Card Type", "Qty", "Gross", "Net", "Fee"])
 
-    data = [{
-        "Date": t.batch_date,
-        "Card Type": t.card_type,
-        "Qty": t.quantity,
-        "Gross": t.gross,
-        "Net": t.net,
-        "Fee": t.fee
-    } for t in transactions]
-
-    df = pd.DataFrame(data)
-    grouped = df.groupby(["Date", "Card Type"], as_index=False).sum(numeric_only=True)
-    grouped = grouped.sort_values(by="Date", ascending=ascending)
+    grouped = _sorted(daily_aggregate(transactions).frame, ascending)
+    grand_row = _grand_row(grouped, ["Date", "Card Type"])
 
-    grouped["Qty"] = grouped["Qty"].round(0).astype(int)
-    grouped["Gross"] = grouped["Gross"].round(2)
-    grouped["Net"] = grouped["Net"].round(2)
-    grouped["Fee"] = grouped["Fee"].round(2)
+    if hide_transactions:
+        return _dollars(grand_row)
 
     grouped["Date"] = grouped["Date"].mask(grouped["Date"].duplicated(), "")
+    return _dollars(pd.concat([grouped, grand_row], ignore_index=True))
 
-    grand_totals = grouped[["Qty", "Gross", "Net", "Fee"]].sum(numeric_only=True)
-    grand_row = pd.DataFrame([{
-        "Date": "GRAND TOTAL",
-        "Card Type": "",
-        "Qty": int(grand_totals["Qty"]),
-        "Gross": round(grand_totals["Gross"], 2),
-        "Net": round(grand_totals["Net"], 2),
-        "Fee": round(grand_totals["Fee"], 2)
-    }])
-
-    return grand_row if hide_transactions else pd.concat([grouped, grand_row], ignore_index=True)
 
+@timed("report.daily_totals", rows=lambda result, *a, **k: len(result))
 def group_by_date_totals_only(transactions, ascending=True):
     if not transactions:
         return pd.DataFrame(columns=["Date", "Qty", "Gross", "Net", "Fee"])
 
-    data = [{
-        "Date": t.batch_date,
-        "Qty": t.quantity,
-        "Gross": t.gross,
-        "Net": t.net,
-        "Fee": t.fee
-    } for t in transactions]
-
-    df = pd.DataFrame(data)
-    grouped = df.groupby("Date", as_index=False).sum(numeric_only=True)
-    grouped = grouped.sort_values(by="Date", ascending=ascending)
-
-    grouped["Qty"] = grouped["Qty"].round(0).astype(int)
-    grouped["Gross"] = grouped["Gross"].round(2)
-    grouped["Net"] = grouped["Net"].round(2)
-    grouped["Fee"] = grouped["Fee"].round(2)
-
-    grand_totals = grouped[["Qty", "Gross", "Net", "Fee"]].sum(numeric_only=True)
-    grand_row = pd.DataFrame([{
-        "Date": "GRAND TOTAL",
-        "Qty": int(grand_totals["Qty"]),
-        "Gross": round(grand_totals["Gross"], 2),
-        "Net": round(grand_totals["Net"], 2),
-        "Fee": round(grand_totals["Fee"], 2)
-    }])
-
-    return pd.concat([grouped, grand_row], ignore_index=True)
+    daily = daily_aggregate(transactions).by_date()
+    grouped = _sorted(daily[["Date", "Qty", "Gross", "Net", "Fee"]], ascending)
+
+    return _dollars(pd.concat([grouped, _grand_row(grouped, ["Date"])], ignore_index=True))
+
+
+@timed("report.period_totals", rows=lambda result, *a, **k: len(result))
+def period_totals_report(transactions, period, ascending=True):
+    """ Daily Totals rolled up to "week", "month" or "year"; Date holds the week's Monday, the month or the year. """
+    if not transactions:
+        return pd.DataFrame(columns=["Date", "Qty", "EBT Food Stamp", "Gross", "Net", "Fee"])
+
+    totals = daily_aggregate(transactions).by_period(period).by_date()
+    grouped = _sorted(totals[["Date", "Qty", "EBT Food Stamp", "Gross", "Net", "Fee"]], ascending)
+
+    return _dollars(pd.concat([grouped, _grand_row(grouped, ["Date"])], ignore_index=True))
+
+
+@timed("report.card_type_mix", rows=lambda result, *a, **k: len(result))
+def card_type_mix_report(transactions):
+    """ Totals per card type, largest gross first, with each card type's share of the gross. """
+    if not transactions:
+        return pd.DataFrame(columns=["Card Type", "Qty", "Gross", "Net", "Fee", "Share %"])
+
+    mix = daily_aggregate(transactions).by_card_type()
+    mix = mix.sort_values(by=["Gross", "Card Type"], ascending=[False, True], kind="stable")
+    grand = mix[MEASURES].sum()
+    grand_row = pd.DataFrame([{"Card Type": "GRAND TOTAL", **{col: int(grand[col]) for col in MEASURES}}])
+
+    report = pd.concat([mix, grand_row], ignore_index=True)
+    report["Share %"] = (report["Gross"] * 100 / grand["Gross"]).round(2) if grand["Gross"] else 0.0
+    return _dollars(report)
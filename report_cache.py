@@ -0,0 +1,96 @@
+# report_cache.py
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import edit_overlay
+import program_manager
+import report_analyzer
+from instrumentation import count
+
+# Finished report frames kept; the least recently shown is dropped first.
+MAX_REPORTS = 16
+
+VIEWS = ("With EBT food", "Group by Date", "Daily Totals", "Weekly Totals", "Monthly Totals", "Card Type Mix")
+# Views rolled up from the daily cells, and the period each one rolls up to.
+PERIOD_VIEWS = {"Weekly Totals": "week", "Monthly Totals": "month"}
+
+_reports = OrderedDict()
+
+
+def get_report(file_name, view, ascending=True, totals_only=False):
+    """ A finished report frame, reused while the loaded files and saved edits are unchanged.
+
+    Keyed by file selection, view, sort order, totals-only flag and the data and
+    edit versions. A sort flip reverses the cached opposite-order frame instead
+    of rebuilding it. Frames are shared: callers must not modify them.
+    """
+    totals_only = bool(totals_only) and view == "Group by Date"
+    if view == "Card Type Mix":
+        ascending = True  # ordered by gross, not by date
+    base = (file_name, view, totals_only, program_manager.data_version, edit_overlay.version)
+
+    report = _get(base + (ascending,))
+    if report is not None:
+        count("report_cache.hit")
+        return report
+
+    flipped = _get(base + (not ascending,))
+    if flipped is not None and not _ambiguous(file_name, view):
+        count("report_cache.flip")
+        report = _reverse_dates(flipped, view)
+    else:
+        count("report_cache.miss")
+        report = _build(file_name, view, ascending, totals_only)
+
+    _reports[base + (ascending,)] = report
+    while len(_reports) > MAX_REPORTS:
+        _reports.popitem(last=False)
+    return report
+
+
+def clear():
+    _reports.clear()
+
+
+def _get(key):
+    report = _reports.get(key)
+    if report is not None:
+        _reports.move_to_end(key)
+    return report
+
+
+def _build(file_name, view, ascending, totals_only):
+    return build(program_manager.get_aggregate(file_name), view, ascending, totals_only)
+
+
+def build(aggregate, view, ascending=True, totals_only=False):
+    """ A report view of any aggregate, uncached (e.g. one month of it). """
+    if view == "With EBT food":
+        return report_analyzer.ebt_summary_report(aggregate, ascending=ascending)
+    if view == "Daily Totals":
+        return report_analyzer.group_by_date_totals_only(aggregate, ascending=ascending)
+    if view == "Group by Date":
+        return report_analyzer.group_by_date_with_summary(aggregate, ascending=ascending, hide_transactions=totals_only)
+    if view in PERIOD_VIEWS:
+        return report_analyzer.period_totals_report(aggregate, PERIOD_VIEWS[view], ascending=ascending)
+    if view == "Card Type Mix":
+        return report_analyzer.card_type_mix_report(aggregate)
+    return pd.DataFrame()
+
+
+def _ambiguous(file_name, view):
+    # Group by Date blanks repeated dates, so a batch dated "" could not be told from a continuation row.
+    return view == "Group by Date" and (program_manager.get_aggregate(file_name).frame["Date"] == "").any()
+
+
+def _reverse_dates(report, view):
+    """ The report in the opposite date order: date blocks reversed, rows within a date and the grand total kept. """
+    if len(report) <= 1:
+        return report
+    body = report.iloc[:-1]
+    if view == "Group by Date":
+        block = np.cumsum(body["Date"].to_numpy() != "")
+    else:
+        block = np.arange(len(body))
+    order = np.lexsort((np.arange(len(body)), -block))
+    return pd.concat([body.iloc[order], report.iloc[-1:]], ignore_index=True)
@@ -0,0 +1,355 @@
+# report_server.py
+"""Serve card transaction reports to other machines over local HTTP/JSON.
+
+    python report_server.py xml_files --port 8765
+
+Holds the parsed files and aggregates in memory once for every client.
+
+    GET  /health                              status, loaded files, data version
+    GET  /files                               loaded file names
+    GET  /report?view=ebt&file=All+Files&sort=newest&totals_only=0
+    GET  /export?format=xlsx&view=group&...   the same report as xlsx, pdf, csv or parquet
+    GET  /edits?file=NAME                     saved edits of one file
+    POST /edits  {"edits": [{"file", "date", "card_type", "field", "value"}]}   null value deletes
+    POST /reload                              re-read the folder now
+
+Only the standard library is used. Everything touching the loaded set in
+program_manager runs on one core thread, like the GUI's worker. Parsing for a
+reload or a folder change runs on a separate ingest thread, and only the
+finished tables are swapped in on the core thread, so reports keep being served
+from the last loaded data meanwhile. Edits are queued to a single writer that
+saves whatever has piled up in one transaction; exports are rendered in a
+process pool so a long PDF does not hold up other requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import edit_db
+import program_manager
+import report_cache
+import xml_parser
+from batch_report import FORMATS, VIEWS
+from folder_watcher import FolderWatcher
+
+# Largest request body accepted, in bytes.
+MAX_BODY = 10 * 1024 * 1024
+# Seconds a client gets to send its whole request before the connection is dropped.
+READ_TIMEOUT = 30.0
+# Seconds between checks of the watched folder.
+WATCH_INTERVAL = 2.0
+
+CONTENT_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _render_export(df, fmt):
+    """ The report as the bytes of an export file; runs in a worker process. """
+    fd, path = tempfile.mkstemp(suffix="." + fmt)
+    os.close(fd)
+    try:
+        if fmt == "xlsx":
+            from excel_exporter import export_to_excel
+            export_to_excel(df, path)
+        elif fmt == "pdf":
+            from pdf_exporter import export_to_pdf
+            export_to_pdf(df, path)
+        elif fmt == "csv":
+            df.to_csv(path, index=False)
+        else:
+            df.to_parquet(path, index=False)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+class ReportServer:
+    """ Asyncio HTTP front end over the ingestion and report core. """
+
+    def __init__(self, folder, workers=None, watch=True):
+        self.folder = folder
+        self.workers = workers or os.cpu_count() or 1
+        self.core = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-core")
+        self.ingest = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-ingest")
+        # Not forked: the core, ingest and watcher threads are already running by the first export.
+        self.exports = ProcessPoolExecutor(max_workers=self.workers, mp_context=xml_parser.pool_context())
+        self.watcher = FolderWatcher(folder) if watch else None
+        self.edit_queue = None
+        self.tasks = []
+
+    async def _core(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.core, fn, *args)
+
+    async def _ingest(self, changed, removed=(), replace=False):
+        """ Parse off the core thread, then publish the new files in one short core step. """
+        parsed = await asyncio.get_running_loop().run_in_executor(
+            self.ingest, program_manager.parse_paths, changed, True, self.workers, not replace)
+        await self._core(program_manager.publish, parsed, removed, replace)
+        return await self._core(sorted, program_manager.transaction_cache)
+
+    def _xml_paths(self):
+        return sorted(os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                      if name.lower().endswith(".xml"))
+
+    async def start(self, host="127.0.0.1", port=8765):
+        await self._ingest(self._xml_paths(), replace=True)
+        self.edit_queue = asyncio.Queue()
+        self.tasks.append(asyncio.create_task(self._edit_writer()))
+        if self.watcher is not None:
+            self.watcher.start()
+            self.tasks.append(asyncio.create_task(self._watch()))
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.watcher is not None:
+            self.watcher.stop()
+        await self._core(edit_db.close_db)
+        self.core.shutdown()
+        self.ingest.shutdown()
+        self.exports.shutdown(cancel_futures=True)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            changed, removed = self.watcher.poll()
+            if changed or removed:
+                try:
+                    await self._ingest([os.path.join(self.folder, name) for name in changed],
+                                       [os.path.join(self.folder, name) for name in removed])
+                except Exception as e:
+                    print(f"Warning: could not reload changed XML files: {e}")
+
+    async def _edit_writer(self):
+        """ The only place edits are written: each round saves everything queued so far in one transaction. """
+        while True:
+            batch = [await self.edit_queue.get()]
+            while not self.edit_queue.empty():
+                batch.append(self.edit_queue.get_nowait())
+            try:
+                await self._core(_write_edits, [edit for edits, _ in batch for edit in edits])
+            except Exception as e:
+                for _, done in batch:
+                    if not done.done():
+                        done.set_exception(e)
+            else:
+                for edits, done in batch:
+                    if not done.done():
+                        done.set_result(len(edits))
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                try:
+                    method, target, body = await asyncio.wait_for(_read_request(reader), READ_TIMEOUT)
+                except asyncio.TimeoutError:
+                    raise HTTPError(408, "Request not received in time")
+                status, content_type, payload, headers = await self._route(method, target, body)
+            except HTTPError as e:
+                status, content_type, payload, headers = e.status, "application/json", {"error": str(e)}, {}
+            except Exception as e:
+                print(f"Report server error: {e}")
+                status, content_type, payload, headers = 500, "application/json", {"error": str(e)}, {}
+            if content_type == "application/json":
+                payload = json.dumps(payload).encode("utf-8")
+            head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}", "Connection: close"]
+            head += [f"{name}: {value}" for name, value in headers.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/files"): self.files,
+            ("GET", "/report"): self.report,
+            ("GET", "/export"): self.export,
+            ("GET", "/edits"): self.get_edits,
+            ("POST", "/edits"): self.post_edits,
+            ("POST", "/reload"): self.reload,
+        }
+        handler = routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in routes):
+                raise HTTPError(405, f"{method} not allowed on {url.path}")
+            raise HTTPError(404, f"No such endpoint: {url.path}")
+        result = await handler(query, body)
+        if isinstance(result, tuple):
+            return result
+        return 200, "application/json", result, {}
+
+    async def health(self, query, body):
+        return {"status": "ok", "files": len(program_manager.transaction_cache),
+                "data_version": program_manager.data_version}
+
+    async def files(self, query, body):
+        return {"files": await self._core(sorted, program_manager.transaction_cache)}
+
+    async def _report(self, query):
+        view = query.get("view", "ebt")
+        view = VIEWS.get(view, view)
+        if view not in report_cache.VIEWS:
+            raise HTTPError(400, f"Unknown view: {view}")
+        file_name = query.get("file", "All Files")
+        if file_name != "All Files" and file_name not in program_manager.transaction_cache:
+            raise HTTPError(404, f"No such file: {file_name}")
+        sort = query.get("sort", "newest")
+        if sort not in ("newest", "oldest"):
+            raise HTTPError(400, f"Unknown sort: {sort}")
+        totals_only = query.get("totals_only", "0").lower() in ("1", "true", "yes")
+        df = await self._core(report_cache.get_report, file_name, view, sort == "oldest", totals_only)
+        return file_name, view, df
+
+    async def report(self, query, body):
+        file_name, view, df = await self._report(query)
+        return {"file": file_name, "view": view, "columns": list(df.columns),
+                "rows": [list(row) for row in zip(*(df[col].tolist() for col in df.columns))]}
+
+    async def export(self, query, body):
+        fmt = query.get("format", "xlsx")
+        if fmt not in FORMATS:
+            raise HTTPError(400, f"Unknown format: {fmt}")
+        file_name, view, df = await self._report(query)
+        if df.empty:
+            raise HTTPError(404, f"No transactions for {file_name}")
+        data = await asyncio.get_running_loop().run_in_executor(self.exports, _render_export, df, fmt)
+        name = f"{view.lower().replace(' ', '_')}.{fmt}"
+        return 200, CONTENT_TYPES[fmt], data, {"Content-Disposition": f'attachment; filename="{name}"'}
+
+    async def get_edits(self, query, body):
+        if "file" not in query:
+            raise HTTPError(400, "file is required")
+        edits = await self._core(edit_db.get_edits_for_file, query["file"])
+        return {"file": query["file"], "edits": [
+            {"date": date, "card_type": card_type, "field": field, "value": value}
+            for (date, card_type, field), value in edits.items()]}
+
+    async def post_edits(self, query, body):
+        try:
+            items = json.loads(body or b"{}")["edits"]
+            edits = [(item["file"], item["date"], item["card_type"], item["field"], item.get("value"))
+                     for item in items]
+        except (ValueError, KeyError, TypeError) as e:
+            raise HTTPError(400, f'Expected {{"edits": [{{"file", "date", "card_type", "field", "value"}}]}}: {e}')
+        done = asyncio.get_running_loop().create_future()
+        await self.edit_queue.put((edits, done))
+        await done
+        return {"saved": sum(value is not None for *_, value in edits),
+                "deleted": sum(value is None for *_, value in edits)}
+
+    async def reload(self, query, body):
+        files = await self._ingest(self._xml_paths(), replace=True)
+        if self.watcher is not None:
+            self.watcher.start()
+        return {"files": files}
+
+
+def _write_edits(edits):
+    """ Apply queued edits in one transaction; the last edit of each cell, save or delete, is the one kept. """
+    final = {}
+    for filename, date, card_type, field, value in edits:
+        final[(filename, date, card_type, field)] = value
+    with edit_db.batch_edits():
+        saves = [key + (value,) for key, value in final.items() if value is not None]
+        if saves:
+            edit_db.save_edits(saves)
+        for key, value in final.items():
+            if value is None:
+                edit_db.delete_edit(*key)
+
+
+async def _read_request(reader):
+    """ (method, target, body) of one HTTP/1.1 request. """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("client closed the connection")
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HTTPError(400, "Too many headers")
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Bad Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, body
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folder", nargs="?", default="xml_files", help="folder of NAXML files (default: xml_files)")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on (default: 127.0.0.1); there is no authentication, "
+                             "so anyone who can reach it can read reports and change edits")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="parser and export processes (default: one per CPU)")
+    parser.add_argument("--no-watch", action="store_true", help="do not pick up files added to the folder later")
+    return parser
+
+
+async def serve(args):
+    server = ReportServer(args.folder, workers=args.workers, watch=not args.no_watch)
+    listener = await server.start(args.host, args.port)
+    print(f"Serving {len(program_manager.transaction_cache)} file(s) from {args.folder} "
+          f"on http://{args.host}:{args.port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.folder):
+        print(f"Folder not found: {args.folder}", file=sys.stderr)
+        return 2
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# sheet_feed.py
+
+
+class SheetDataFeed:
+    """ Serves a DataFrame to the grid one window of rows at a time.
+
+    Rows are turned into Python lists only for the requested window plus a
+    prefetch margin on either side, so scrolling by a few rows reuses the
+    block that is already materialized. Cells edited in the grid are kept
+    here too, so they are still shown after their rows scroll out and back.
+    """
+
+    def __init__(self, df, prefetch=200, sample_size=1000):
+        self.df = df
+        self.prefetch = prefetch
+        self.sample_size = sample_size
+        self._block_start = 0
+        self._block = []
+        self.edited = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def headers(self):
+        return [str(col) for col in self.df.columns]
+
+    def rows(self, start, stop):
+        """ Rows [start, stop) as lists, materializing a prefetch block around them if needed. """
+        start = max(0, start)
+        stop = min(len(self.df), stop)
+        block_stop = self._block_start + len(self._block)
+        if start < self._block_start or stop > block_stop:
+            self._block_start = max(0, start - self.prefetch)
+            self._block = self.df.iloc[self._block_start:stop + self.prefetch].values.tolist()
+        offset = start - self._block_start
+        window = self._block[offset:offset + (stop - start)]
+        for row, cells in self.edited.items():
+            if start <= row < stop:
+                for column, value in cells.items():
+                    window[row - start][column] = value
+        return window
+
+    def set_cell(self, row, column, value):
+        """ Show value at (row, column) of the report from now on instead of the frame's value. """
+        self.edited.setdefault(row, {})[column] = value
+
+    def sample(self):
+        """ Head, tail and an evenly spaced slice of the middle; enough to size columns. """
+        n = len(self.df)
+        if n <= self.sample_size:
+            return self.df
+        import numpy as np
+        positions = np.unique(np.concatenate([
+            np.arange(self.sample_size // 4),
+            np.arange(n - self.sample_size // 4, n),
+            np.linspace(0, n - 1, self.sample_size // 2, dtype=np.int64),
+        ]))
+        return self.df.iloc[positions]
+
+    def column_widths(self, char_width=8, padding=20, min_width=60, max_width=400):
+        """ Pixel widths estimated from header and sampled cell text lengths. """
+        sample = self.sample()
+        widths = []
+        for col in self.df.columns:
+            lengths = sample[col].astype(str).str.len()
+            longest = max(len(str(col)), int(lengths.max()) if len(lengths) else 0)
+            widths.append(min(max_width, max(min_width, longest * char_width + padding)))
+        return widths
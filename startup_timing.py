@@ -0,0 +1,53 @@
+# startup_timing.py
+import json
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """ Breaks time-to-first-report into phases (import, parse, aggregate, render, ...).
+
+    phases accumulate seconds spent inside `with timer.phase(name)` blocks;
+    marks record wall time since the timer was created, e.g. when the window
+    first appeared. Recording is cheap, so it is always on; the report is only
+    printed or written when asked for.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.marks = {}
+        self.finished = False
+
+    @contextmanager
+    def phase(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            if not self.finished:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - begin
+
+    def mark(self, name):
+        if not self.finished and name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+
+    def finish(self, name="first report"):
+        self.mark(name)
+        self.finished = True
+
+    def report(self):
+        return {
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "marks": {name: round(seconds, 4) for name, seconds in self.marks.items()},
+        }
+
+    def format(self):
+        lines = ["Startup timing:"]
+        lines += [f"  {name:<20}{seconds * 1000:>9.1f} ms" for name, seconds in self.phases.items()]
+        lines += [f"  @ {name:<18}{seconds * 1000:>9.1f} ms" for name, seconds in self.marks.items()]
+        return "\n".join(lines)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,92 @@
+# task_runner.py
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundTasks:
+    """ Runs parsing, aggregation and export off the Tk thread.
+
+    Work goes to a single worker thread, so the caches in program_manager are
+    only ever touched by one thread at a time. Results are handed back to the
+    UI through root.after polling. Every task belongs to a channel; submitting
+    to a channel makes any earlier task on it stale: a queued one is cancelled
+    and a running one has its result dropped.
+    """
+
+    def __init__(self, root, poll_ms=40, on_status=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_status = on_status
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="viewer-worker")
+        self.results = queue.Queue()
+        self.latest = {}
+        self.futures = {}
+        self.pending = 0
+        self.polling = False
+        self.closed = False
+
+    def submit(self, channel, fn, on_done=None, on_error=None, message=""):
+        token = self.latest.get(channel, 0) + 1
+        self.latest[channel] = token
+
+        previous = self.futures.get(channel)
+        if previous is not None and previous.cancel():
+            self.pending -= 1
+
+        self.pending += 1
+        future = self.executor.submit(fn)
+        self.futures[channel] = future
+        future.add_done_callback(lambda f: self.results.put((channel, token, f, on_done, on_error)))
+
+        self._status(message)
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def is_busy(self):
+        return self.pending > 0
+
+    def _poll(self):
+        if self.closed:
+            return
+        try:
+            while True:
+                try:
+                    channel, token, future, on_done, on_error = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if future.cancelled():
+                    continue
+                self.pending -= 1
+                if token != self.latest.get(channel):
+                    continue  # superseded while it was running
+                self._deliver(channel, future, on_done, on_error)
+            self._status("" if not self.pending else None)
+        finally:
+            # A failing callback must not leave polling set with nothing scheduled.
+            if self.pending:
+                self.root.after(self.poll_ms, self._poll)
+            else:
+                self.polling = False
+
+    def _deliver(self, channel, future, on_done, on_error):
+        error = future.exception()
+        try:
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    print(f"Background task '{channel}' failed: {error}")
+            elif on_done:
+                on_done(future.result())
+        except Exception as callback_error:
+            print(f"Handler for background task '{channel}' failed: {callback_error}")
+
+    def _status(self, message):
+        if self.on_status:
+            self.on_status(self.pending > 0, message)
+
+    def shutdown(self):
+        self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,43 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import edit_db
+import edit_overlay
+import naxml_generator
+import parse_cache
+import program_manager
+import xml_parser
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """ An empty current folder, so parse_cache.db, user_edits.db and the journal start out missing. """
+    monkeypatch.chdir(tmp_path)
+    _reset()
+    yield tmp_path
+    _reset()
+
+
+def _reset():
+    edit_db.reset_state()
+    parse_cache.close_cache()
+    program_manager._clear()
+    xml_parser.cache.clear()
+    xml_parser.failed.clear()
+    xml_parser.date_index.clear()
+    edit_overlay.invalidate()
+
+
+@pytest.fixture
+def xml_folder(workdir):
+    """ Two small generated settlement files covering consecutive dates. """
+    folder = workdir / "xml_files"
+    naxml_generator.generate_dataset(str(folder), files=2, batches=40, cards=5)
+    return folder
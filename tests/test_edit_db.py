@@ -0,0 +1,76 @@
+# tests/test_edit_db.py
+import json
+import sqlite3
+
+import pytest
+
+import edit_db
+
+
+@pytest.fixture
+def broken_db(monkeypatch):
+    """ Every later edit_db query fails, as with a locked or corrupt user_edits.db. """
+    def fail():
+        raise sqlite3.OperationalError("database disk image is malformed")
+
+    def breaking():
+        monkeypatch.setattr(edit_db, "get_connection", fail)
+    return breaking
+
+
+def _save_some():
+    edit_db.save_edits([
+        ("a.xml", "2025-06-07", "VISA", "gross", 12.5),
+        ("a.xml", "2025-06-07", "MASTERCARD", "net", 3),
+        ("b.xml", "2025-06-08", "VISA", "fee", 0.25),
+    ])
+    edit_db.save_edit("a.xml", "2025-06-07", "VISA", "gross", 13)
+    edit_db.delete_edit("a.xml", "2025-06-07", "MASTERCARD", "net")
+
+
+def test_get_all_edits_falls_back_to_the_journal(workdir, broken_db):
+    _save_some()
+    from_db = sorted(edit_db.get_all_edits())
+
+    broken_db()
+    assert sorted(edit_db.get_all_edits()) == from_db == [
+        ("a.xml", "2025-06-07", "VISA", "gross", "13"),
+        ("b.xml", "2025-06-08", "VISA", "fee", "0.25"),
+    ]
+
+
+def test_get_edits_for_file_falls_back_to_the_journal(workdir, broken_db):
+    _save_some()
+    broken_db()
+    assert edit_db.get_edits_for_file("a.xml") == {("2025-06-07", "VISA", "gross"): "13"}
+
+
+def test_replay_skips_a_torn_last_line(workdir):
+    _save_some()
+    with open(edit_db.JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write('{"op": "save", "filename": "c.xml", "da')
+    assert set(edit_db._replay_journal()) == {("a.xml", "2025-06-07", "VISA", "gross"),
+                                              ("b.xml", "2025-06-08", "VISA", "fee")}
+
+
+def test_imported_edits_reach_the_journal(workdir, broken_db):
+    with open("import.json", "w", encoding="utf-8") as f:
+        json.dump([{"filename": "c.xml", "date": "2025-06-09", "card_type": "EBT", "field": "net", "value": 4}], f)
+    edit_db.import_edits_from_json("import.json")
+
+    broken_db()
+    assert edit_db.get_all_edits() == [("c.xml", "2025-06-09", "EBT", "net", "4")]
+
+
+def test_live_journal_is_not_compacted_in_a_new_process(workdir, monkeypatch):
+    monkeypatch.setattr(edit_db, "COMPACT_THRESHOLD", 10)
+    edit_db.save_edits([(f"{i}.xml", "2025-06-07", "VISA", "gross", i) for i in range(20)])
+    edit_db.reset_state()
+
+    compactions = []
+    monkeypatch.setattr(edit_db, "_compact_in_background", lambda: compactions.append(True))
+    edit_db.save_edit("20.xml", "2025-06-07", "VISA", "gross", 20)
+    assert compactions == []
+
+    edit_db.save_edits([("0.xml", "2025-06-07", "VISA", "gross", i) for i in range(11)])
+    assert compactions == [True]
@@ -0,0 +1,81 @@
+# tests/test_parse_cache.py
+import datetime
+import os
+
+import pytest
+
+import naxml_generator
+import parse_cache
+import xml_parser
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """ The paths xml_parser fully parses from disk, in order. """
+    seen = []
+    parse_whole = xml_parser._parse_whole
+
+    def counting(abs_path, engine=None):
+        seen.append(os.path.basename(abs_path))
+        return parse_whole(abs_path, engine)
+
+    monkeypatch.setattr(xml_parser, "_parse_whole", counting)
+    return seen
+
+
+def _paths(folder):
+    return sorted(str(path) for path in folder.iterdir())
+
+
+def _reload(paths):
+    """ load_many as a fresh process would run it: nothing in memory, only parse_cache.db. """
+    parse_cache.close_cache()
+    xml_parser.cache.clear()
+    xml_parser.date_index.clear()
+    return parse_cache.load_many(paths)
+
+
+def test_unchanged_files_come_from_the_cache(xml_folder, parses):
+    paths = _paths(xml_folder)
+    first = parse_cache.load_many(paths)
+    assert parses == ["settlement_0000.xml", "settlement_0001.xml"]
+
+    again = _reload(paths)
+    assert parses == ["settlement_0000.xml", "settlement_0001.xml"]
+    assert all(a.to_frame().equals(b.to_frame()) for a, b in zip(first, again))
+
+
+def test_touched_but_unchanged_file_is_not_parsed_again(xml_folder, parses):
+    paths = _paths(xml_folder)
+    parse_cache.load_many(paths)
+    stat = os.stat(paths[0])
+    os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+
+    _reload(paths)
+    assert parses == ["settlement_0000.xml", "settlement_0001.xml"]
+
+
+def test_changed_file_is_parsed_again(xml_folder, parses):
+    paths = _paths(xml_folder)
+    before = parse_cache.load_many(paths)
+    naxml_generator.generate_file(paths[0], 60, 5, start_date=datetime.date(2021, 1, 1), seed=99)
+
+    after = _reload(paths)
+    assert parses == ["settlement_0000.xml", "settlement_0001.xml", "settlement_0000.xml"]
+    assert after[0].date_span()[0] == "2021-01-01"
+    assert not after[0].to_frame().equals(before[0].to_frame())
+    assert after[1].to_frame().equals(before[1].to_frame())
+
+
+def test_date_filter_skips_files_outside_the_stored_span(xml_folder, parses):
+    paths = _paths(xml_folder)
+    whole = parse_cache.load_many(paths)
+    first, last = whole[1].date_span()
+
+    parse_cache.close_cache()
+    xml_parser.cache.clear()
+    xml_parser.date_index.clear()
+    filtered = parse_cache.load_many(paths, start_date=first, end_date=last)
+    assert parses == ["settlement_0000.xml", "settlement_0001.xml"]
+    assert len(filtered[0]) == 0
+    assert filtered[1].to_frame().equals(whole[1].to_frame())
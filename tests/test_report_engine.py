@@ -0,0 +1,71 @@
+# tests/test_report_engine.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import naxml_generator
+import xml_parser
+from report_engine import DailyAggregate, MEASURES, period_label
+from transaction_table import TableBuilder, TransactionTable
+
+
+@pytest.fixture
+def table(xml_folder):
+    naxml_generator.generate_file(str(xml_folder / "settlement_0002.xml"), 300, 7, seed=5)
+    return xml_parser.parse_files(sorted(str(path) for path in xml_folder.iterdir()))
+
+
+def _groupby(frame, keys=("Date", "Card Type")):
+    """ The reference: a plain pandas groupby-sum over the raw rows. """
+    frame = frame.astype({"Date": str, "Card Type": str})
+    return frame.groupby(list(keys), as_index=False, sort=True)[MEASURES].sum()
+
+
+def _plain(frame):
+    return frame.astype({"Date": str, "Card Type": str}).reset_index(drop=True)
+
+
+def test_daily_aggregate_matches_groupby(table):
+    merged = TransactionTable.concat(table)
+    aggregate = DailyAggregate.from_table(merged)
+
+    expected = _groupby(merged.to_frame())
+    pd.testing.assert_frame_equal(_plain(aggregate.frame), expected, check_dtype=False)
+    assert all(aggregate.frame[m].dtype == np.int64 for m in MEASURES)
+
+
+def test_merged_partials_match_groupby_of_all_rows(table):
+    merged = DailyAggregate.merge(DailyAggregate.from_table(part) for part in table)
+
+    expected = _groupby(TransactionTable.concat(table).to_frame())
+    pd.testing.assert_frame_equal(_plain(merged.frame), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("period", ["week", "month", "year"])
+def test_by_period_matches_groupby(table, period):
+    rows = TransactionTable.concat(table).to_frame().astype({"Date": str, "Card Type": str})
+    rows["Date"] = rows["Date"].map(lambda date: period_label(date, period))
+
+    rolled = DailyAggregate.from_table(TransactionTable.concat(table)).by_period(period)
+    pd.testing.assert_frame_equal(_plain(rolled.frame), _groupby(rows), check_dtype=False)
+
+
+def test_split_by_month_adds_back_up(table):
+    aggregate = DailyAggregate.from_table(TransactionTable.concat(table))
+    months = aggregate.split("month")
+
+    assert len(months) > 1
+    assert all(part.frame["Date"].str.startswith(month).all() for month, part in months.items())
+    pd.testing.assert_frame_equal(_plain(DailyAggregate.merge(months.values()).frame), _plain(aggregate.frame))
+
+
+def test_undated_rows_keep_their_label():
+    builder = TableBuilder()
+    builder.append("UNKNOWN", "VISA", 1, 100, 90, 10)
+    builder.append("2025-06-07", "VISA", 2, 200, 180, 20)
+    builder.append("UNKNOWN", "VISA", 3, 300, 270, 30)
+    aggregate = DailyAggregate.from_table(builder.build())
+
+    expected = _groupby(builder.build().to_frame())
+    pd.testing.assert_frame_equal(_plain(aggregate.frame), expected, check_dtype=False)
+    assert list(aggregate.by_period("month").frame["Date"]) == ["2025-06", "UNKNOWN"]
@@ -0,0 +1,56 @@
+# tests/test_report_server.py
+import asyncio
+import json
+import threading
+import urllib.request
+
+import pytest
+
+import report_server
+
+
+@pytest.fixture
+def server(xml_folder):
+    """ A running ReportServer on a free port, with the watcher thread on as in production. """
+    app = report_server.ReportServer(str(xml_folder), workers=2, watch=True)
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(app.start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+
+    async def stop():
+        listener.close()
+        await listener.wait_closed()
+        await app.close()
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+
+
+def _get(url, data=None):
+    request = urllib.request.Request(url, data=data, method="POST" if data is not None else "GET")
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.status, response.headers["Content-Type"], response.read()
+
+
+def test_report_edit_and_export_round_trip(server):
+    status, _, body = _get(server + "/health")
+    assert status == 200 and json.loads(body)["files"] == 2
+
+    report = json.loads(_get(server + "/report?view=group&sort=oldest")[2])
+    date, card_type = report["rows"][0][:2]
+    file_name = json.loads(_get(server + "/files")[2])["files"][0]
+
+    edit = {"edits": [{"file": file_name, "date": date, "card_type": card_type, "field": "gross", "value": "12.34"}]}
+    assert json.loads(_get(server + "/edits", json.dumps(edit).encode())[2]) == {"saved": 1, "deleted": 0}
+    edited = json.loads(_get(server + f"/report?view=group&sort=oldest&file={file_name}")[2])
+    assert edited["rows"][0][edited["columns"].index("Gross")] == 12.34
+
+    # Rendered in the export process pool, which is started after the server's threads.
+    status, content_type, body = _get(server + "/export?format=csv&view=ebt")
+    assert status == 200 and content_type.startswith("text/csv")
+    lines = body.decode("utf-8").splitlines()
+    assert lines[0].startswith("Date,") and lines[-1].startswith("GRAND TOTAL")
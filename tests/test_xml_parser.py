@@ -0,0 +1,21 @@
+# tests/test_xml_parser.py
+import instrumentation
+import xml_parser
+
+
+def test_pool_parse_matches_serial_and_reports_worker_timings(xml_folder, monkeypatch, tmp_path):
+    paths = sorted(str(path) for path in xml_folder.iterdir())
+    serial = xml_parser.parse_files(paths)
+    xml_parser.cache.clear()
+
+    monkeypatch.setattr(xml_parser, "MIN_POOL_FILES", 2)
+    monkeypatch.setattr(instrumentation, "_stats", {})
+    instrumentation.enable(str(tmp_path / "metrics.jsonl"))
+    try:
+        pooled = xml_parser.parse_files(paths, workers=2)
+    finally:
+        instrumentation.disable()
+
+    assert all(a.to_frame().equals(b.to_frame()) for a, b in zip(serial, pooled))
+    assert instrumentation.summary()["parse"]["calls"] == 2
+    assert instrumentation.summary()["parse"]["rows"] == sum(len(t) for t in serial)
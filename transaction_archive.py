@@ -0,0 +1,166 @@
+# transaction_archive.py
+import glob
+import os
+import numpy as np
+import pandas as pd
+from transaction_table import TransactionTable, to_cents
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only needed to write or read the archive
+    pa = pq = None
+
+ARCHIVE_DIR = "archive"
+FORMATS = ("feather", "parquet")
+# Partition for rows without a usable BatchDate.
+UNDATED = "unknown"
+
+_COLUMNS = ("batch_date", "card_type", "quantity", "gross", "net", "fee")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The transaction archive needs pyarrow (pip install pyarrow).")
+
+
+def _month(date):
+    return date[:7] if date and date != "UNKNOWN" and len(date) >= 7 else UNDATED
+
+
+def partition_path(root, month, file_name, fmt="feather"):
+    """ root/month=YYYY-MM/<file name>.<fmt>: one file per source file and batch month. """
+    return os.path.join(root, f"month={month}", f"{file_name}.{fmt}")
+
+
+def write_table(file_name, table, root=ARCHIVE_DIR, fmt="feather"):
+    """ Archive one source file's transactions, split by batch month; returns the paths written.
+
+    Earlier partitions of the same source file are replaced. Feather is written
+    uncompressed so it can be memory-mapped on reload; Parquet is smaller but
+    has to be decoded.
+    """
+    _require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown archive format: {fmt}")
+
+    # Exact names only: "a.xml.*" would also match the partitions of a source file named "a.xml.bak".
+    stale = {path for ext in FORMATS
+             for path in glob.glob(os.path.join(glob.escape(root), "month=*", glob.escape(f"{file_name}.{ext}")))}
+    written = []
+    if len(table):
+        months = np.array([_month(d) for d in table.batch_date.categories], dtype=object)
+        row_months = months[table.batch_date.codes]
+        for month in sorted(set(months[np.unique(table.batch_date.codes)])):
+            mask = row_months == month
+            part = table if mask.all() else _take(table, mask)
+            path = partition_path(root, month, file_name, fmt)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            _write(_to_arrow(part, file_name), tmp_path, fmt)
+            os.replace(tmp_path, path)
+            stale.discard(path)
+            written.append(path)
+
+    for path in stale:
+        os.remove(path)
+    return written
+
+
+def write_archive(tables, root=ARCHIVE_DIR, fmt="feather"):
+    """ write_table for every {file name: TransactionTable}; returns all paths written. """
+    written = []
+    for file_name, table in tables.items():
+        written.extend(write_table(file_name, table, root, fmt))
+    return written
+
+
+def months(root=ARCHIVE_DIR):
+    """ Sorted partition months present in the archive ("unknown" last). """
+    found = [name[len("month="):] for name in os.listdir(root) if name.startswith("month=")] if os.path.isdir(root) else []
+    return sorted(found, key=lambda m: (m == UNDATED, m))
+
+
+def read_archive(root=ARCHIVE_DIR, start_date=None, end_date=None, card_types=None):
+    """ {source file name: TransactionTable} from the archive, optionally narrowed like TransactionTable.filter.
+
+    Only the month partitions overlapping [start_date, end_date] are opened.
+    Feather partitions are memory-mapped and their numeric columns and category
+    codes used in place, so a file whose rows fall in one month is not copied at all.
+    """
+    _require_pyarrow()
+    ranged = start_date is not None or end_date is not None
+    parts = {}
+    for month in months(root):
+        if month == UNDATED:
+            if ranged:
+                continue
+        elif (start_date is not None and month < start_date[:7]) or (end_date is not None and month > end_date[:7]):
+            continue
+        folder = os.path.join(root, f"month={month}")
+        for name in sorted(os.listdir(folder)):
+            file_name, ext = os.path.splitext(name)
+            if ext[1:] in FORMATS:
+                parts.setdefault(file_name, []).append(_read(os.path.join(folder, name), ext[1:]))
+
+    return {file_name: TransactionTable.concat(tables).filter(start_date, end_date, card_types)
+            for file_name, tables in parts.items()}
+
+
+def _take(table, mask):
+    return TransactionTable(
+        table.batch_date[mask].remove_unused_categories(),
+        table.card_type[mask].remove_unused_categories(),
+        table.quantity[mask], table.gross[mask], table.net[mask], table.fee[mask],
+    )
+
+
+def _dictionary(values):
+    return pa.DictionaryArray.from_arrays(pa.array(values.codes), pa.array(list(values.categories), pa.string()))
+
+
+def _to_arrow(table, file_name):
+    return pa.table({
+        "batch_date": _dictionary(table.batch_date),
+        "card_type": _dictionary(table.card_type),
+        "quantity": pa.array(table.quantity),
+        "gross": pa.array(table.gross),
+        "net": pa.array(table.net),
+        "fee": pa.array(table.fee),
+    }, metadata={"source_file": file_name})
+
+
+def _write(arrow_table, path, fmt):
+    if fmt == "feather":
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+    else:
+        pq.write_table(arrow_table, path)
+
+
+def _read(path, fmt):
+    if fmt == "feather":
+        arrow_table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    else:
+        arrow_table = pq.read_table(path)
+    arrow_table = arrow_table.combine_chunks()
+    columns = [arrow_table.column(name).chunk(0) if arrow_table.num_rows else None for name in _COLUMNS]
+    if columns[0] is None:
+        return TransactionTable.empty()
+
+    def categorical(array):
+        return pd.Categorical.from_codes(array.indices.to_numpy(zero_copy_only=True),
+                                         categories=array.dictionary.to_pylist())
+
+    return TransactionTable(
+        categorical(columns[0]), categorical(columns[1]),
+        columns[2].to_numpy(zero_copy_only=True),
+        *(_cents(array) for array in columns[3:]),
+    )
+
+
+def _cents(array):
+    # Archives written before amounts were kept in cents hold float dollars.
+    if pa.types.is_floating(array.type):
+        return to_cents(array.to_numpy(zero_copy_only=False))
+    return array.to_numpy(zero_copy_only=True)
@@ -0,0 +1,169 @@
+# transaction_table.py
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from card_transaction import CardTransaction
+
+# Money columns hold whole cents; dollars only appear in finished reports.
+CENTS = 100
+
+
+class TransactionTable:
+    """ Column-oriented set of card transactions.
+
+    batch_date and card_type are categoricals with sorted categories, the
+    numeric columns are plain int64 NumPy arrays with gross, net and fee in
+    cents, so sums are exact. Iterating still yields CardTransaction objects
+    (amounts in dollars) for code that wants rows.
+    """
+    __slots__ = ("batch_date", "card_type", "quantity", "gross", "net", "fee")
+
+    def __init__(self, batch_date, card_type, quantity, gross, net, fee):
+        self.batch_date = _categorical(batch_date)
+        self.card_type = _categorical(card_type)
+        self.quantity = np.asarray(quantity, dtype=np.int64)
+        self.gross = np.asarray(gross, dtype=np.int64)
+        self.net = np.asarray(net, dtype=np.int64)
+        self.fee = np.asarray(fee, dtype=np.int64)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [])
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        builder = TableBuilder()
+        for t in transactions:
+            builder.append(t.batch_date, t.card_type, t.quantity, t.gross, t.net, t.fee)
+        return builder.build()
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        return cls(
+            union_categoricals([t.batch_date for t in tables], sort_categories=True),
+            union_categoricals([t.card_type for t in tables], sort_categories=True),
+            np.concatenate([t.quantity for t in tables]),
+            np.concatenate([t.gross for t in tables]),
+            np.concatenate([t.net for t in tables]),
+            np.concatenate([t.fee for t in tables]),
+        )
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def __iter__(self):
+        dates = self.batch_date.categories[self.batch_date.codes]
+        card_types = self.card_type.categories[self.card_type.codes]
+        for row in zip(dates, card_types, self.quantity.tolist(), (self.gross / CENTS).tolist(),
+                       (self.net / CENTS).tolist(), (self.fee / CENTS).tolist()):
+            yield CardTransaction(*row)
+
+    def __repr__(self):
+        return f"<TransactionTable rows={len(self)}>"
+
+    def filter(self, start_date=None, end_date=None, card_types=None):
+        """ Rows dated within [start_date, end_date] and, if given, of one of card_types.
+
+        Dates are ISO strings compared inclusively; either bound may be None.
+        Returns self when nothing is filtered out.
+        """
+        mask = None
+        if start_date is not None or end_date is not None:
+            keep = np.array([date_in_range(d, start_date, end_date) for d in self.batch_date.categories], dtype=bool)
+            mask = keep[self.batch_date.codes]
+        if card_types is not None:
+            keep = np.asarray(self.card_type.categories.isin(list(card_types)), dtype=bool)
+            mask = keep[self.card_type.codes] if mask is None else mask & keep[self.card_type.codes]
+        if mask is None or mask.all():
+            return self
+        return TransactionTable(
+            self.batch_date[mask].remove_unused_categories(),
+            self.card_type[mask].remove_unused_categories(),
+            self.quantity[mask], self.gross[mask], self.net[mask], self.fee[mask],
+        )
+
+    def date_span(self):
+        """ (first, last) BatchDate present in the table, ignoring undated rows; (None, None) if there are none. """
+        counts = np.bincount(self.batch_date.codes, minlength=len(self.batch_date.categories)) if len(self) else []
+        used = self.batch_date.categories[np.flatnonzero(counts)] if len(self) else []
+        dates = [d for d in used if d and d != "UNKNOWN"]
+        return (min(dates), max(dates)) if dates else (None, None)
+
+    def to_frame(self):
+        """ The table as a DataFrame with the report column names (amounts in cents), without copying columns. """
+        return pd.DataFrame({
+            "Date": self.batch_date,
+            "Card Type": self.card_type,
+            "Qty": self.quantity,
+            "Gross": self.gross,
+            "Net": self.net,
+            "Fee": self.fee,
+        }, copy=False)
+
+
+class TableBuilder:
+    """ Column buffers the parser appends to before freezing them into a TransactionTable.
+
+    Amounts are appended in dollars and stored as cents right away, so a
+    value that is not a finite number fails on its own row.
+    """
+
+    def __init__(self):
+        self.batch_date = []
+        self.card_type = []
+        self.quantity = []
+        self.gross = []
+        self.net = []
+        self.fee = []
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def append(self, batch_date, card_type, quantity, gross, net, fee):
+        self.batch_date.append(batch_date)
+        self.card_type.append(card_type)
+        self.quantity.append(quantity)
+        self.gross.append(round(gross * CENTS))
+        self.net.append(round(net * CENTS))
+        self.fee.append(round(fee * CENTS))
+
+    def build(self):
+        return TransactionTable(self.batch_date, self.card_type, self.quantity,
+                                self.gross, self.net, self.fee)
+
+
+def date_in_range(date, start_date=None, end_date=None):
+    """ Inclusive check on ISO date strings; undated rows ("UNKNOWN") only pass an open range. """
+    if start_date is None and end_date is None:
+        return True
+    if not date or date == "UNKNOWN":
+        return False
+    return (start_date is None or date >= start_date) and (end_date is None or date <= end_date)
+
+
+def to_cents(dollars):
+    """ Dollar amounts (floats or numeric strings) as int64 cents, rounded to the nearest cent. """
+    cents = np.rint(np.asarray(dollars, dtype=np.float64) * CENTS)
+    if not np.isfinite(cents).all():
+        raise ValueError("Amount is not a finite number")
+    return cents.astype(np.int64)
+
+
+def as_table(transactions):
+    """ Accept a TransactionTable or any iterable of CardTransaction. """
+    if isinstance(transactions, TransactionTable):
+        return transactions
+    return TransactionTable.from_transactions(transactions)
+
+
+def _categorical(values):
+    if isinstance(values, pd.Categorical):
+        if values.categories.is_monotonic_increasing:
+            return values
+        return values.reorder_categories(values.categories.sort_values())
+    return pd.Categorical(values)